@@ -2,13 +2,89 @@ import os
 import re
 import sys
 import time
+import random
+import threading
+import openpyxl
 import requests
-import pandas as pd
 from tqdm import tqdm
+from itertools import count
+from collections import Counter
 from datetime import datetime
 from urllib3.util.retry import Retry
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.utils import get_column_letter
+from openpyxl.styles import Font, Alignment, PatternFill, Border, Side, NamedStyle
 from requests.adapters import HTTPAdapter
-from requests.exceptions import ChunkedEncodingError, HTTPError
+from requests.exceptions import RequestException
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# orjson parses the model metadata several times faster; stdlib json is the fallback
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+# Number of metadata requests in flight in Phase 1
+METADATA_WORKERS = 16
+
+# Number of models downloaded at the same time in Phase 2
+DOWNLOAD_WORKERS = 4
+
+# Upper bound in seconds for the randomized retry back-off
+MAX_BACKOFF = 30
+
+# Connections kept alive by the adapter shared across all sessions
+POOL_SIZE = 16
+
+# Read size for streamed downloads (256 KiB keeps syscall count low on large files)
+CHUNK_SIZE = 256 * 1024
+
+# Excel report styles, shared by every cell that uses them
+HEADER_FILL = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
+HEADER_FONT = Font(name="Calibri", size=12, bold=True, color="FFFFFF")
+SUMMARY_FILL = PatternFill(start_color="D9E1F2", end_color="D9E1F2", fill_type="solid")
+SUMMARY_FONT = Font(name="Calibri", size=12, bold=True)
+SUCCESS_FILL = PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid")
+ERROR_FILL = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")
+SKIP_FILL = PatternFill(start_color="FFEB9C", end_color="FFEB9C", fill_type="solid")
+BORDER = Border(
+    left=Side(style='thin'), 
+    right=Side(style='thin'), 
+    top=Side(style='thin'), 
+    bottom=Side(style='thin')
+)
+CENTER = Alignment(horizontal='center', vertical='center')
+VCENTER = Alignment(vertical='center')
+
+# Status cell fill keyed by the first word of the status text
+STATUS_FILLS = {
+    "Success": SUCCESS_FILL,
+    "Failed": ERROR_FILL,
+    "ERROR": ERROR_FILL,
+    "Skipped": SKIP_FILL
+}
+
+# S.No and Model ID columns are center-aligned
+CENTER_COLUMNS = {1, 2}
+
+# Report columns (metadata keys starting with "_" stay out of the sheet) and their widths
+COLUMNS = ["S.No", "Model ID", "Model Name", "Tags", "Trigger Words", "Base Model",
+           "SHA256", "AutoV1", "File Size", "NSFW", "Status"]
+COLUMN_WIDTHS = [8, 12, 40, 30, 50, 15, 20, 20, 15, 8, 30]
+
+# Patterns used on every entry / download
+_MODEL_ID_RE = re.compile(r"/models/(\d+)")
+_FILENAME_RE = re.compile(r'filename="([^"]+)"')
+
+# Per-thread session (and progress bar slot for the download workers)
+_thread_local = threading.local()
+
+# One adapter per pool size, shared by every session in the process
+_shared_adapters = {}
+_shared_adapters_lock = threading.Lock()
+
+# Guards the set of file names reserved by this run's download workers
+_claimed_names_lock = threading.Lock()
 
 # ===[ 0. Setup and Utility Functions ]===
 def print_banner():
@@ -18,168 +94,221 @@ def print_banner():
 -------------------------------------------------------
     """)
 
-def create_session(api_key):
-    """Create and configure requests session with retries"""
-    session = requests.Session()
+def create_adapter(pool_size=POOL_SIZE):
+    """Create an HTTP adapter with retries and a bounded connection pool"""
     retry = Retry(
         total=5,
         backoff_factor=1,
         status_forcelist=[429, 500, 502, 503, 504],
         allowed_methods=["HEAD", "GET", "OPTIONS", "POST"]
     )
-    session.mount("https://", HTTPAdapter(max_retries=retry))
+    return HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        pool_block=True,
+        max_retries=retry
+    )
+
+def get_shared_adapter(pool_size=POOL_SIZE):
+    """Return the process-wide adapter for pool_size, creating it once"""
+    with _shared_adapters_lock:
+        adapter = _shared_adapters.get(pool_size)
+        if adapter is None:
+            adapter = _shared_adapters[pool_size] = create_adapter(pool_size)
+        return adapter
+
+def create_session(api_key, pool_size=POOL_SIZE):
+    """Create and configure requests session with retries"""
+    session = requests.Session()
+    adapter = get_shared_adapter(pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
     session.headers.update({
         "User-Agent": "python-requests/2.x",
         "Authorization": f"Bearer {api_key}"
     })
     return session
 
+def get_thread_session(api_key):
+    """Return the calling thread's session, creating it on first use"""
+    session = getattr(_thread_local, "session", None)
+    if session is None:
+        session = create_session(api_key)
+        _thread_local.session = session
+    return session
+
 def fetch_json(session, path, params=None):
     """Fetch JSON from API endpoint"""
     url = "https://civitai.com/api/v1" + path
     r = session.get(url, params=params, timeout=10)
     r.raise_for_status()
-    return r.json()
+    return json_loads(r.content)
 
-def download_with_progress(session, url, fallback, out_dir):
-    """Download file with progress bar and proper retries"""
-    for attempt in range(1, 6):
-        try:
-            resp = session.get(url, stream=True, timeout=30)
-            resp.raise_for_status()
-            
-            # Get filename from headers or use fallback
-            cd = resp.headers.get("content-disposition", "")
-            m = re.search(r'filename="([^"]+)"', cd)
-            fname = m.group(1) if m else fallback
-            out_path = os.path.join(out_dir, fname)
-            
-            # Skip if file already exists
-            if os.path.exists(out_path):
-                print(f"  File already exists, skipping: {fname}")
-                return fname
-            
-            # Download with progress bar
-            total = int(resp.headers.get("content-length", 0))
-            with open(out_path, "wb") as f, tqdm(
-                total=total, unit="B", unit_scale=True,
-                desc=f"Downloading {fname}"
-            ) as bar:
-                for chunk in resp.iter_content(8192):
-                    if chunk:
-                        f.write(chunk)
-                        bar.update(len(chunk))
-            return fname
-        except (ChunkedEncodingError, HTTPError) as e:
-            print(f"  [Attempt {attempt}/5] download error: {e}")
-            time.sleep(2 ** (attempt-1))
-    return None
-
-def style_excel(filename):
-    """Apply styling to Excel file to make it beautiful"""
-    import openpyxl
-    from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-    from openpyxl.utils import get_column_letter
+def backoff_delay(attempt, retry_after=None):
+    """Seconds to wait before retrying: the server's Retry-After if given, else jittered exponential back-off"""
+    if retry_after and retry_after.isdigit():
+        return int(retry_after)
+    return random.uniform(0, min(MAX_BACKOFF, 2 ** (attempt-1)))
+
+def claim_name(claimed, fname):
+    """Reserve fname for one download; False if another job of this run already has it"""
+    with _claimed_names_lock:
+        if fname in claimed:
+            return False
+        claimed.add(fname)
+        return True
+
+def release_name(claimed, fname, out_dir):
+    """Give back a name reserved by claim_name, dropping its unfinished .part file"""
+    part_path = os.path.join(out_dir, fname) + ".part"
+    if os.path.exists(part_path):
+        os.remove(part_path)
+    with _claimed_names_lock:
+        claimed.discard(fname)
+
+def download_with_progress(session, url, fallback, out_dir, position=0, existing=None, claimed=None):
+    """Download file with progress bar and proper retries
     
-    wb = openpyxl.load_workbook(filename)
-    ws = wb.active
+    existing is the set of file names already in out_dir; it is scanned
+    from disk when not given. claimed is the set of names reserved by this
+    run, shared between workers so two jobs never write the same file.
     
-    # Define styles
-    header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-    header_font = Font(name="Calibri", size=12, bold=True, color="FFFFFF")
-    success_fill = PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid")
-    error_fill = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")
-    skip_fill = PatternFill(start_color="FFEB9C", end_color="FFEB9C", fill_type="solid")
-    border = Border(
-        left=Side(style='thin'), 
-        right=Side(style='thin'), 
-        top=Side(style='thin'), 
-        bottom=Side(style='thin')
-    )
+    Returns (file name, duplicate): the name is None when the download
+    failed, and duplicate is True when another job had already claimed it.
+    """
+    if existing is None:
+        existing = set(os.listdir(out_dir))
+    if claimed is None:
+        claimed = set()
     
-    # Style header row
-    for col in range(1, ws.max_column + 1):
-        cell = ws.cell(row=1, column=col)
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal='center', vertical='center')
+    # Skip before connecting when the fallback name is already on disk
+    if fallback in existing:
+        print(f"  File already exists, skipping: {fallback}")
+        return fallback, False
     
-    # Style data rows and apply conditional formatting
-    for row in range(2, ws.max_row + 1):
-        # Apply borders to all cells
-        for col in range(1, ws.max_column + 1):
-            cell = ws.cell(row=row, column=col)
-            cell.border = border
-            cell.alignment = Alignment(vertical='center')
-            
-            # Center-align certain columns
-            if col in [1, 2]:  # S.No and Model ID columns
-                cell.alignment = Alignment(horizontal='center', vertical='center')
-        
-        # Get status cell and apply conditional formatting
-        status_cell = ws.cell(row=row, column=ws.max_column)
-        if "Success" in str(status_cell.value):
-            status_cell.fill = success_fill
-        elif "Failed" in str(status_cell.value) or "ERROR" in str(status_cell.value):
-            status_cell.fill = error_fill
-        elif "Skipped" in str(status_cell.value):
-            status_cell.fill = skip_fill
+    own_name = None
+    for attempt in range(1, 6):
+        try:
+            with session.get(url, stream=True, timeout=30) as resp:
+                resp.raise_for_status()
+                
+                # Get filename from headers or use fallback
+                cd = resp.headers.get("content-disposition", "")
+                m = _FILENAME_RE.search(cd)
+                fname = m.group(1) if m else fallback
+                out_path = os.path.join(out_dir, fname)
+                
+                # Skip if file already exists; leaving the block closes the
+                # response without reading the body
+                if fname in existing:
+                    print(f"  File already exists, skipping: {fname}")
+                    return fname, False
+                
+                # Reserve the name before writing, so a second job resolving
+                # to the same file is skipped instead of writing over this one
+                if fname != own_name:
+                    if not claim_name(claimed, fname):
+                        print(f"  Another download is already saving {fname}, skipping")
+                        return fname, True
+                    if own_name is not None:
+                        release_name(claimed, own_name, out_dir)
+                    own_name = fname
+                
+                # Download with progress bar into a .part file, renamed once
+                # complete so a file under its final name is always whole
+                total = int(resp.headers.get("content-length", 0))
+                part_path = out_path + ".part"
+                # Redraw at most twice a second and only check after each MiB,
+                # so parallel bars do not contend on tqdm's lock every chunk
+                with open(part_path, "wb") as f, tqdm(
+                    total=total, unit="B", unit_scale=True,
+                    desc=f"Downloading {fname}", position=position,
+                    mininterval=0.5, miniters=1024 * 1024, leave=False
+                ) as bar:
+                    for chunk in resp.iter_content(chunk_size=CHUNK_SIZE):
+                        if chunk:
+                            f.write(chunk)
+                            bar.update(len(chunk))
+                os.replace(part_path, out_path)
+                return fname, False
+        except RequestException as e:
+            # Dropped connections and read timeouts retry like HTTP errors, so
+            # one bad download ends as a failed row instead of stopping Phase 2
+            print(f"  [Attempt {attempt}/5] download error: {e}")
+            response = getattr(e, "response", None)
+            retry_after = response.headers.get("Retry-After") if response is not None else None
+            time.sleep(backoff_delay(attempt, retry_after))
     
-    # Adjust column widths
-    for col in range(1, ws.max_column + 1):
-        column_letter = get_column_letter(col)
-        # Set custom widths based on column content
-        if col == 1:  # S.No
-            ws.column_dimensions[column_letter].width = 8
-        elif col == 2:  # Model ID
-            ws.column_dimensions[column_letter].width = 12
-        elif col == 3:  # Model Name
-            ws.column_dimensions[column_letter].width = 40
-        elif col == 4:  # Tags
-            ws.column_dimensions[column_letter].width = 30
-        elif col == 5:  # Trigger words
-            ws.column_dimensions[column_letter].width = 50
-        elif col == 6:  # Base Model
-            ws.column_dimensions[column_letter].width = 15
-        elif col in [7, 8]:  # Hash columns
-            ws.column_dimensions[column_letter].width = 20
-        elif col == 9:  # File Size
-            ws.column_dimensions[column_letter].width = 15
-        elif col == 10:  # NSFW
-            ws.column_dimensions[column_letter].width = 8
-        else:  # Status
-            ws.column_dimensions[column_letter].width = 30
+    if own_name is not None:
+        release_name(claimed, own_name, out_dir)
+    return None, False
+
+def status_key(status):
+    """Return the first word of a status, which decides its fill and summary bucket"""
+    return str(status).split(" ", 1)[0]
+
+def summary_text(rows):
+    """Build the summary line shown above the report table"""
+    counts = Counter(status_key(row["Status"]) for row in rows)
+    success_count = counts["Success"]
+    failed_count = counts["Failed"] + counts["ERROR"]
+    skipped_count = counts["Skipped"]
     
-    # Freeze header row
-    ws.freeze_panes = "A2"
+    return f"CivitAI Models Summary | Total: {len(rows)} | Success: {success_count} | Failed: {failed_count} | Skipped: {skipped_count} | Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}"
+
+def status_fill(status):
+    """Return the fill for a status cell, or None to leave it plain"""
+    return STATUS_FILLS.get(status_key(status))
+
+def write_excel(filename, rows):
+    """Write metadata rows to a styled Excel file in a single pass"""
+    # Write-only mode streams rows straight to disk; column widths, frozen
+    # panes and merged cells have to be declared before the first row
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Sheet1")
+    for col, width in enumerate(COLUMN_WIDTHS, 1):
+        ws.column_dimensions[get_column_letter(col)].width = width
+    ws.freeze_panes = "A4"
+    ws.merged_cells.add(f"A1:{get_column_letter(len(COLUMNS))}1")
     
-    # Add summary at the top
-    ws.insert_rows(1, 2)
-    ws.merge_cells('A1:K1')
-    summary_cell = ws.cell(row=1, column=1)
-    total_models = ws.max_row - 3  # Accounting for header and this summary row
+    # Data cells take border and alignment from one registered named style
+    # instead of setting each attribute per cell
+    wb.add_named_style(NamedStyle(name="data_center", border=BORDER, alignment=CENTER))
+    wb.add_named_style(NamedStyle(name="data_row", border=BORDER, alignment=VCENTER))
+    data_styles = ["data_center" if col in CENTER_COLUMNS else "data_row" for col in range(1, len(COLUMNS) + 1)]
     
-    # Count statuses
-    success_count = 0
-    failed_count = 0
-    skipped_count = 0
+    # Summary at the top, then a spacer row
+    summary_cell = WriteOnlyCell(ws, value=summary_text(rows))
+    summary_cell.font = SUMMARY_FONT
+    summary_cell.fill = SUMMARY_FILL
+    summary_cell.alignment = CENTER
+    summary_cell.border = BORDER
+    ws.append([summary_cell])
+    ws.append([])
     
-    for row in range(4, ws.max_row + 1):
-        status = ws.cell(row=row, column=ws.max_column).value
-        if status and "Success" in status:
-            success_count += 1
-        elif status and ("Failed" in status or "ERROR" in status):
-            failed_count += 1
-        elif status and "Skipped" in status:
-            skipped_count += 1
+    # Header row
+    header_cells = []
+    for header in COLUMNS:
+        cell = WriteOnlyCell(ws, value=header)
+        cell.fill = HEADER_FILL
+        cell.font = HEADER_FONT
+        cell.alignment = CENTER
+        header_cells.append(cell)
+    ws.append(header_cells)
     
-    summary_cell.value = f"CivitAI Models Summary | Total: {total_models} | Success: {success_count} | Failed: {failed_count} | Skipped: {skipped_count} | Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}"
-    summary_cell.font = Font(name="Calibri", size=12, bold=True)
-    summary_cell.fill = PatternFill(start_color="D9E1F2", end_color="D9E1F2", fill_type="solid")
-    summary_cell.alignment = Alignment(horizontal='center', vertical='center')
-    summary_cell.border = border
+    # Data rows with borders and conditional status formatting
+    for row in rows:
+        cells = []
+        for key, style in zip(COLUMNS, data_styles):
+            cell = WriteOnlyCell(ws, value=row[key])
+            cell.style = style
+            cells.append(cell)
+        
+        fill = status_fill(row["Status"])
+        if fill:
+            cells[-1].fill = fill
+        ws.append(cells)
     
-    # Save the styled workbook
     wb.save(filename)
     return filename
 
@@ -188,10 +317,14 @@ def detect_nsfw_from_tags(tags, nsfw_flag=False):
     if not tags:
         return "SFW"
     
-    # Check if any tag contains "nsfw" (case insensitive)
-    for tag in tags:
-        if isinstance(tag, str) and "nsfw" in tag.lower():
-            return "NSFW"
+    # Check if any tag contains "nsfw" (case insensitive); joining first lowers
+    # all tags in one call instead of allocating a lowered copy per tag
+    try:
+        joined_tags = "\n".join(tags)
+    except TypeError:
+        joined_tags = "\n".join(tag for tag in tags if isinstance(tag, str))
+    if "nsfw" in joined_tags.lower():
+        return "NSFW"
     
     # If model is explicitly flagged as NSFW but no NSFW tags
     if nsfw_flag:
@@ -243,18 +376,13 @@ def main():
         print("No models to process.")
         sys.exit(0)
 
-    # Remove duplicates and extract model IDs
-    unique_model_ids = []
-    seen_ids = set()
-    
+    # Remove duplicates and extract model IDs (dict keeps first-seen order)
+    seen_ids = {}
     for entry in entries:
         # Extract numeric model ID from URL or accept ID
-        m = re.search(r"/models/(\d+)", entry)
-        model_id = m.group(1) if m else entry
-        
-        if model_id not in seen_ids:
-            seen_ids.add(model_id)
-            unique_model_ids.append(model_id)
+        m = _MODEL_ID_RE.search(entry)
+        seen_ids.setdefault(m.group(1) if m else entry, None)
+    unique_model_ids = list(seen_ids)
 
     print(f"Found {len(unique_model_ids)} unique models out of {len(entries)} entries.")
 
@@ -262,102 +390,99 @@ def main():
     os.makedirs("CivitModels", exist_ok=True)
     os.makedirs("CivitData", exist_ok=True)
 
-    # Create HTTP session
-    session = create_session(API_KEY)
-    
     # ===[ Phase 1: Collect all metadata first ]===
     print("\n------- PHASE 1: COLLECTING METADATA -------")
-    all_metadata = []  # List to hold metadata for all models
     
-    for idx, model_id in enumerate(unique_model_ids, 1):
-        print(f"\nFetching metadata {idx}/{len(unique_model_ids)}: ID {model_id}")
-        
-        try:
-            md = fetch_json(session, f"/models/{model_id}")
-            
-            # Extract version and file info
-            ver = md["modelVersions"][0]
-            file0 = ver["files"][0]
-            hashes = file0.get("hashes", {})
-            
-            # Extract basic fields
-            model_name = md.get("name", "—")
-            trigger_words = ver.get("trainedWords", [])
-            base_model = ver.get("baseModel", "—")
-            sha256_hash = hashes.get("SHA256", "—")
-            autov1_hash = hashes.get("AutoV1", "—")
-            file_size = file0.get("sizeKB", 0)
-            file_size_formatted = f"{file_size/1024:.2f} MB" if file_size else "—"
-            
-            # Extract tags and check for NSFW
-            tags = md.get("tags", [])
-            is_nsfw_flagged = md.get("nsfw", False)
-            nsfw_status = detect_nsfw_from_tags(tags, is_nsfw_flagged)
-            
-            # Store download URL for later
-            dl_url = file0["downloadUrl"] + f"?token={API_KEY}"
-            
-            all_metadata.append({
-                "S.No": idx,
-                "Model ID": model_id,
-                "Model Name": model_name,
-                "Tags": ", ".join(tags) if tags else "—",
-                "Trigger Words": "; ".join(trigger_words) or "—",
-                "Base Model": base_model,
-                "SHA256": sha256_hash,
-                "AutoV1": autov1_hash,
-                "File Size": file_size_formatted,
-                "NSFW": nsfw_status,
-                "Status": "Pending",
-                # Hidden metadata for download phase
-                "_download_url": dl_url,
-                "_filename": f"{model_name.replace(' ','_')}.safetensors",
-                "_is_nsfw": is_nsfw_flagged or nsfw_status == "NSFW"
-            })
-            
-            print(f"  Got metadata for '{model_name}' ({base_model}, {file_size_formatted})")
-            
-        except HTTPError as e:
-            print(f"  Failed to fetch metadata: {e}")
-            all_metadata.append({
-                "S.No": idx,
-                "Model ID": model_id,
-                "Model Name": "ERROR - Failed to fetch",
-                "Tags": "—",
-                "Trigger Words": "—",
-                "Base Model": "—",
-                "SHA256": "—",
-                "AutoV1": "—",
-                "File Size": "—",
-                "NSFW": "—",
-                "Status": "Failed to fetch metadata",
-                # No download info
-                "_download_url": None,
-                "_filename": None,
-                "_is_nsfw": False
-            })
-            continue
+    def fetch_model(idx, model_id):
+        print(f"Fetching metadata {idx}/{len(unique_model_ids)}: ID {model_id}")
+        return fetch_json(get_thread_session(API_KEY), f"/models/{model_id}")
     
-    # Generate first Excel file with just metadata
-    print("\nCreating initial metadata Excel file...")
+    # Requests run concurrently; results are keyed by S.No to keep input order
+    results = {}
+    with ThreadPoolExecutor(max_workers=METADATA_WORKERS) as executor:
+        futures = {
+            executor.submit(fetch_model, idx, model_id): (idx, model_id)
+            for idx, model_id in enumerate(unique_model_ids, 1)
+        }
+        for future in as_completed(futures):
+            idx, model_id = futures[future]
+            try:
+                md = future.result()
+                
+                # Extract version and file info
+                ver = md["modelVersions"][0]
+                file0 = ver["files"][0]
+                hashes = file0.get("hashes", {})
+                
+                # Extract basic fields
+                model_name = md.get("name", "—")
+                trigger_words = ver.get("trainedWords", [])
+                base_model = ver.get("baseModel", "—")
+                sha256_hash = hashes.get("SHA256", "—")
+                autov1_hash = hashes.get("AutoV1", "—")
+                file_size = file0.get("sizeKB", 0)
+                file_size_formatted = f"{file_size/1024:.2f} MB" if file_size else "—"
+                
+                # Extract tags and check for NSFW
+                tags = md.get("tags", [])
+                is_nsfw_flagged = md.get("nsfw", False)
+                nsfw_status = detect_nsfw_from_tags(tags, is_nsfw_flagged)
+                
+                # Store download URL for later; the session's Bearer header
+                # authenticates it, so the key never ends up in the URL
+                dl_url = file0["downloadUrl"]
+                
+                results[idx] = {
+                    "S.No": idx,
+                    "Model ID": model_id,
+                    "Model Name": model_name,
+                    "Tags": ", ".join(tags) if tags else "—",
+                    "Trigger Words": "; ".join(trigger_words) or "—",
+                    "Base Model": base_model,
+                    "SHA256": sha256_hash,
+                    "AutoV1": autov1_hash,
+                    "File Size": file_size_formatted,
+                    "NSFW": nsfw_status,
+                    "Status": "Pending",
+                    # Hidden metadata for download phase
+                    "_download_url": dl_url,
+                    "_filename": f"{model_name.replace(' ','_')}.safetensors",
+                    "_is_nsfw": is_nsfw_flagged or nsfw_status == "NSFW"
+                }
+                
+                print(f"  Got metadata for '{model_name}' ({base_model}, {file_size_formatted})")
+                
+            except RequestException as e:
+                # HTTP errors, exhausted 429 retries, timeouts and dropped
+                # connections all leave a failed row instead of ending the run
+                print(f"  Failed to fetch metadata for ID {model_id}: {e}")
+                results[idx] = {
+                    "S.No": idx,
+                    "Model ID": model_id,
+                    "Model Name": "ERROR - Failed to fetch",
+                    "Tags": "—",
+                    "Trigger Words": "—",
+                    "Base Model": "—",
+                    "SHA256": "—",
+                    "AutoV1": "—",
+                    "File Size": "—",
+                    "NSFW": "—",
+                    "Status": "Failed to fetch metadata",
+                    # No download info
+                    "_download_url": None,
+                    "_filename": None,
+                    "_is_nsfw": False
+                }
     
-    # Remove internal fields for Excel display
-    display_metadata = []
-    for item in all_metadata:
-        display_item = item.copy()
-        for k in list(display_item.keys()):
-            if k.startswith("_"):
-                del display_item[k]
-        display_metadata.append(display_item)
+    # List to hold metadata for all models, in input order
+    all_metadata = [results[idx] for idx in sorted(results)]
     
-    df = pd.DataFrame(display_metadata)
+    # Generate first Excel file with just metadata
+    print("\nCreating initial metadata Excel file...")
     
     # Name the Excel file based on number of links
     excel_filename = f"CivitData/{len(unique_model_ids)}_models.xlsx"
-    df.to_excel(excel_filename, index=False, engine='openpyxl')
-    
-    # Style the Excel file to make it beautiful
-    styled_file = style_excel(excel_filename)
+    styled_file = write_excel(excel_filename, all_metadata)
     print(f"  Created initial metadata Excel file: {styled_file}")
     
     # ===[ Phase 2: Download models ]===
@@ -377,51 +502,66 @@ def main():
     else:
         download_nsfw = False
     
+    # Apply the skip rules up front so only real downloads reach the workers
+    pending = []
     for idx, model_data in enumerate(all_metadata, 1):
         model_id = model_data["Model ID"]
         model_name = model_data["Model Name"]
         dl_url = model_data.get("_download_url")
-        filename = model_data.get("_filename")
         is_nsfw = model_data.get("_is_nsfw", False)
         
         if not dl_url:
             print(f"\nSkipping model {idx}/{len(all_metadata)}: ID {model_id} (no download URL)")
             continue
         
-        print(f"\nProcessing download {idx}/{len(all_metadata)}: {model_name} (ID: {model_id})")
-        
         # Handle NSFW content based on global choice
         if is_nsfw and not download_nsfw:
+            print(f"\nSkipping model {idx}/{len(all_metadata)}: {model_name} (ID: {model_id})")
             print(f"  Model is NSFW. Skipping based on your preference.")
             model_data["Status"] = "Skipped (NSFW)"
             continue
         
-        # Download file
-        downloaded = download_with_progress(session, dl_url, filename, "CivitModels")
-        if downloaded:
-            print(f"  Model saved to CivitModels/{downloaded}")
-            model_data["Status"] = f"Success - {downloaded}"
-        else:
-            print(f"  Download failed for model {model_id}")
-            model_data["Status"] = "Download failed"
+        pending.append((idx, model_data))
     
-    # Generate final Excel file with updated statuses
-    print("\nCreating final metadata Excel file with download statuses...")
+    # One session per worker thread, all sharing the Phase 1 connection pool
+    worker_slots = count()
+    
+    # Scan the output folder once instead of stat-ing every target path
+    existing = set(os.listdir("CivitModels"))
+    claimed = set()
     
-    # Remove internal fields for Excel display again
-    final_display_metadata = []
-    for item in all_metadata:
-        display_item = item.copy()
-        for k in list(display_item.keys()):
-            if k.startswith("_"):
-                del display_item[k]
-        final_display_metadata.append(display_item)
+    def download_one(idx, model_data):
+        session = get_thread_session(API_KEY)
+        if not hasattr(_thread_local, "slot"):
+            _thread_local.slot = next(worker_slots)
+        print(f"Processing download {idx}/{len(all_metadata)}: {model_data['Model Name']} (ID: {model_data['Model ID']})")
+        return download_with_progress(
+            session, model_data["_download_url"], model_data["_filename"],
+            "CivitModels", position=_thread_local.slot, existing=existing, claimed=claimed
+        )
     
-    df = pd.DataFrame(final_display_metadata)
-    df.to_excel(excel_filename, index=False, engine='openpyxl')
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+        futures = {
+            executor.submit(download_one, idx, model_data): model_data
+            for idx, model_data in pending
+        }
+        for future in as_completed(futures):
+            model_data = futures[future]
+            downloaded, duplicate = future.result()
+            if duplicate:
+                print(f"  Skipped model {model_data['Model ID']}: CivitModels/{downloaded} is another model's download")
+                model_data["Status"] = f"Skipped (Duplicate file) - {downloaded}"
+            elif downloaded:
+                print(f"  Model saved to CivitModels/{downloaded}")
+                model_data["Status"] = f"Success - {downloaded}"
+            else:
+                print(f"  Download failed for model {model_data['Model ID']}")
+                model_data["Status"] = "Download failed"
+    
+    # Generate final Excel file with updated statuses
+    print("\nCreating final metadata Excel file with download statuses...")
     
-    # Style the Excel file to make it beautiful
-    styled_file = style_excel(excel_filename)
+    styled_file = write_excel(excel_filename, all_metadata)
     print(f"  Created final metadata Excel file: {styled_file}")
     
     print("\nAll tasks complete!")
@@ -2,23 +2,51 @@ import os
 import re
 import sys
 import time
+import queue
+import random
 import requests
-from io import BytesIO
-from PIL import Image
 from typing import Dict, Tuple, Optional, Any
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from requests.exceptions import RequestException, Timeout, ConnectionError
 
 # Constants
 API_BASE = "https://civitai.com/api/v1"
 MAX_RETRIES = 5
 RETRY_DELAY = 3
+MAX_BACKOFF = 30
 ROOT_FOLDER = "CivitImg"
 REQUEST_TIMEOUT = 30
+IMAGE_WORKERS = 16
+GALLERY_QUEUE_SIZE = 256
+POOL_SIZE = 16
+CHUNK_SIZE = 256 * 1024
+
+# Precompiled patterns
+_MODEL_ID_RE = re.compile(r"/models/(\d+)")
+_VERSION_RE = re.compile(r"modelVersionId=(\d+)")
+_INVALID_FILENAME_RE = re.compile(r'[<>:"/\\|?*]')
+
+def create_adapter(pool_size: int = POOL_SIZE) -> HTTPAdapter:
+    """Create an HTTP adapter with a bounded connection pool."""
+    return HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, pool_block=True)
+
+def backoff_delay(retries: int, retry_after: Optional[str] = None) -> float:
+    """Seconds to wait before a retry: the server's Retry-After if given, else jittered exponential back-off."""
+    if retry_after and retry_after.isdigit():
+        return float(retry_after)
+    return random.uniform(0, min(MAX_BACKOFF, RETRY_DELAY * 2 ** retries))
+
+# Shared by every session in the process so connections are reused
+SHARED_ADAPTER = create_adapter()
 
 class CivitaiDownloader:
     def __init__(self, api_key: str):
         self.api_key = api_key
         self.headers = {'Authorization': f'Bearer {api_key}'}
+        self.session = requests.Session()
+        self.session.mount("https://", SHARED_ADAPTER)
+        self.session.mount("http://", SHARED_ADAPTER)
         os.makedirs(ROOT_FOLDER, exist_ok=True)
     
     def prompt_mode(self) -> Dict[str, str]:
@@ -46,8 +74,8 @@ class CivitaiDownloader:
     
     def parse_url(self, url: str) -> Tuple[str, Optional[str]]:
         """Parse model ID and version ID from URL."""
-        model_match = re.search(r"/models/(\d+)", url)
-        version_match = re.search(r"modelVersionId=(\d+)", url)
+        model_match = _MODEL_ID_RE.search(url)
+        version_match = _VERSION_RE.search(url)
         
         if not model_match:
             print("Invalid model URL format")
@@ -65,7 +93,7 @@ class CivitaiDownloader:
         
         while retries < MAX_RETRIES:
             try:
-                response = requests.get(
+                response = self.session.get(
                     url, 
                     headers=self.headers, 
                     params=params,
@@ -76,8 +104,8 @@ class CivitaiDownloader:
                     return response.json()
                 elif response.status_code == 429 or response.status_code == 524:
                     # Rate limiting
-                    wait_time = int(response.headers.get('Retry-After', RETRY_DELAY))
-                    print(f"Rate limit hit. Waiting {wait_time}s before retry.")
+                    wait_time = backoff_delay(retries, response.headers.get('Retry-After'))
+                    print(f"Rate limit hit. Waiting {wait_time:.1f}s before retry.")
                     time.sleep(wait_time)
                     retries += 1
                 elif response.status_code == 404:
@@ -87,15 +115,16 @@ class CivitaiDownloader:
                     print(f"API request failed with status code: {response.status_code}")
                     if retries >= MAX_RETRIES - 1:
                         raise ConnectionError(f"Failed after {MAX_RETRIES} attempts. Last status: {response.status_code}")
+                    time.sleep(backoff_delay(retries))
                     retries += 1
-                    time.sleep(RETRY_DELAY)
                     
             except (ConnectionError, Timeout) as e:
-                print(f"Connection issue: {str(e)}. Retrying in {RETRY_DELAY}s...")
                 if retries >= MAX_RETRIES - 1:
                     raise ConnectionError(f"Connection failed after {MAX_RETRIES} attempts: {str(e)}")
+                wait_time = backoff_delay(retries)
+                print(f"Connection issue: {str(e)}. Retrying in {wait_time:.1f}s...")
                 retries += 1
-                time.sleep(RETRY_DELAY)
+                time.sleep(wait_time)
             except Exception as e:
                 print(f"Unexpected error: {str(e)}")
                 raise
@@ -132,7 +161,7 @@ class CivitaiDownloader:
     def sanitize_filename(self, name: str) -> str:
         """Sanitize string for use as filename."""
         # Remove invalid filename characters
-        sanitized = re.sub(r'[<>:"/\\|?*]', '_', name)
+        sanitized = _INVALID_FILENAME_RE.sub('_', name)
         # Truncate to reasonable length
         return sanitized[:100]
     
@@ -141,26 +170,30 @@ class CivitaiDownloader:
         retries = 0
         while retries < MAX_RETRIES:
             try:
-                response = requests.get(url, stream=True, timeout=REQUEST_TIMEOUT)
-                if not response.ok:
-                    print(f"Failed to download image (HTTP {response.status_code}): {url}")
-                    retries += 1
-                    time.sleep(RETRY_DELAY)
-                    continue
-                
-                # Process and save the image
-                img = Image.open(BytesIO(response.content))
-                img.convert("RGBA").save(filepath, "PNG")
+                with self.session.get(url, stream=True, timeout=REQUEST_TIMEOUT) as response:
+                    if not response.ok:
+                        print(f"Failed to download image (HTTP {response.status_code}): {url}")
+                        time.sleep(backoff_delay(retries, response.headers.get('Retry-After')))
+                        retries += 1
+                        continue
+                    
+                    # Stream the original bytes to disk; the .part suffix keeps
+                    # an interrupted download from passing the "exists" check
+                    part_path = filepath + ".part"
+                    with open(part_path, "wb") as f:
+                        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                            f.write(chunk)
+                    os.replace(part_path, filepath)
                 return True
                 
             except Timeout:
                 print(f"Timeout downloading image: {url}. Retrying...")
+                time.sleep(backoff_delay(retries))
                 retries += 1
-                time.sleep(RETRY_DELAY)
             except ConnectionError:
                 print(f"Connection error downloading image: {url}. Retrying...")
+                time.sleep(backoff_delay(retries))
                 retries += 1
-                time.sleep(RETRY_DELAY)
             except Exception as e:
                 print(f"Error processing image {url}: {str(e)}")
                 return False
@@ -168,6 +201,21 @@ class CivitaiDownloader:
         print(f"Failed to download image after {MAX_RETRIES} attempts: {url}")
         return False
     
+    def download_queued_images(self, work: queue.Queue, results: list) -> None:
+        """Download queued (url, filepath) items until a None sentinel arrives."""
+        while (item := work.get()) is not None:
+            try:
+                results.append(self.download_image(*item))
+            except OSError as e:
+                print(f"Error saving image {item[1]}: {str(e)}")
+                results.append(False)
+    
+    def fetch_gallery_page(self, params: Dict[str, Any]) -> list:
+        """Fetch one page of gallery image items."""
+        print(f"Fetching page {params['page']} of gallery images...")
+        response_data = self.make_api_request("images", params)
+        return response_data.get('items', [])
+    
     def download_gallery(self, model_id: str, version_id: Optional[str], model_name: str, filters: Dict[str, str]) -> None:
         """Download all images from a model's gallery."""
         params = {
@@ -180,66 +228,76 @@ class CivitaiDownloader:
         if version_id:
             params['modelVersionId'] = version_id
         
-        # Create model subfolder
-        model_folder = os.path.join(ROOT_FOLDER, self.sanitize_filename(model_name))
+        # Create model subfolder; the sanitized name is also the image filename prefix
+        safe_model_name = self.sanitize_filename(model_name)
+        model_folder = os.path.join(ROOT_FOLDER, safe_model_name)
         os.makedirs(model_folder, exist_ok=True)
         
-        total_images = 0
-        failed_images = 0
+        # Names already on disk (or queued this run), scanned once up front
+        existing = set(os.listdir(model_folder))
+        # Image paths are this prefix plus the file name, so the loop skips os.path.join
+        folder_prefix = os.path.join(model_folder, "")
+        
+        results = []  # One True/False per queued image, appended by the workers
         
         try:
-            while True:
+            # Pages are fetched here and their images queued for the worker pool,
+            # so downloads carry on across page boundaries
+            work = queue.Queue(maxsize=GALLERY_QUEUE_SIZE)
+            with ThreadPoolExecutor(max_workers=IMAGE_WORKERS) as executor:
+                for _ in range(IMAGE_WORKERS):
+                    executor.submit(self.download_queued_images, work, results)
                 try:
-                    print(f"Fetching page {params['page']} of gallery images...")
-                    response_data = self.make_api_request("images", params)
-                    
-                    items = response_data.get('items', [])
-                    if not items:
-                        print("No more images available")
-                        break
-                    
-                    print(f"Processing {len(items)} images from page {params['page']}")
-                    
-                    for i, img in enumerate(items):
-                        url = img.get('url')
-                        if not url:
-                            print(f"Missing URL for image at index {i}")
-                            continue
+                    while True:
+                        items = self.fetch_gallery_page(params)
+                        if not items:
+                            print("No more images available")
+                            break
                         
-                        # Extract original filename but use model name as prefix
-                        base_filename = os.path.splitext(url.split('/')[-1])[0]
-                        img_filename = f"{self.sanitize_filename(model_name)}_{base_filename}.png"
-                        img_path = os.path.join(model_folder, img_filename)
+                        print(f"Processing {len(items)} images from page {params['page']}")
                         
-                        # Skip if file already exists
-                        if os.path.exists(img_path):
-                            print(f"Skipping existing file: {img_filename}")
-                            continue
+                        for i, img in enumerate(items):
+                            url = img.get('url')
+                            if not url:
+                                print(f"Missing URL for image at index {i}")
+                                continue
+                            
+                            # Extract original filename and extension but use model name as prefix
+                            base_filename, extension = os.path.splitext(url.split('/')[-1])
+                            img_filename = f"{safe_model_name}_{base_filename}{extension or '.jpg'}"
+                            img_path = folder_prefix + img_filename
+                            
+                            # Skip if file already exists or is already queued
+                            if img_filename in existing:
+                                print(f"Skipping existing file: {img_filename}")
+                                continue
+                            
+                            # Queue the image download; blocks while the workers are a full queue behind
+                            print(f"Downloading: {img_filename}")
+                            existing.add(img_filename)
+                            work.put((url, img_path))
                         
-                        # Download the image
-                        print(f"Downloading: {img_filename}")
-                        success = self.download_image(url, img_path)
+                        # Check for next page
+                        if len(items) < params['limit']:
+                            print("Reached end of gallery")
+                            break
+                        
+                        params['page'] += 1
                         
-                        if success:
-                            total_images += 1
-                        else:
-                            failed_images += 1
-                    
-                    # Check for next page
-                    if len(items) < params['limit']:
-                        print("Reached end of gallery")
-                        break
-                    
-                    # Move to next page
-                    params['page'] += 1
-                    
                 except KeyboardInterrupt:
                     print("Process interrupted by user")
-                    break
+                    # Drop the images still waiting so the workers stop after their current one
+                    while not work.empty():
+                        work.get_nowait()
+                finally:
+                    for _ in range(IMAGE_WORKERS):
+                        work.put(None)
                     
         except Exception as e:
             print(f"Error during gallery download: {str(e)}")
         
+        total_images = results.count(True)
+        failed_images = len(results) - total_images
         print(f"Download complete: {total_images} images saved to {model_folder}/")
         if failed_images > 0:
             print(f"Failed to download {failed_images} images")
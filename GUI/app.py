@@ -1,20 +1,28 @@
 import os
-import io
-import sys 
+import hashlib
+import logging
+import queue
+import random
 import re
 import time
+import threading
 import requests
-import pandas as pd
-import json
 import gradio as gr
 
+from collections import deque
 from datetime import datetime
-from io import BytesIO
-from PIL import Image
+from functools import lru_cache
 from urllib3.util.retry import Retry
 from requests.adapters import HTTPAdapter
 from requests.exceptions import RequestException, Timeout, ConnectionError
 from typing import Dict, Tuple, Optional, Any, List
+from concurrent.futures import ThreadPoolExecutor
+
+# orjson parses the model metadata several times faster; stdlib json is the fallback
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
 
 
 # Custom Hugging Face theme
@@ -31,20 +39,102 @@ hf_theme = gr.themes.Default(
     border_color_primary='#353945',
 )
 
+# Number of model metadata requests in flight at once
+METADATA_WORKERS = 16
+
+# Number of model files downloaded at the same time
+DOWNLOAD_WORKERS = 4
+
+# Number of gallery images downloaded at the same time
+IMAGE_WORKERS = 16
+
+# Gallery items waiting for a free image worker; bounds memory on large galleries
+GALLERY_QUEUE_SIZE = 256
+
+# Bytes per read when streaming downloads to disk
+CHUNK_SIZE = 256 * 1024
+
+# Chunks buffered between the network reader and the disk writer
+WRITE_QUEUE_SIZE = 4
+
+# Connections kept per host; covers every metadata and download worker
+POOL_SIZE = 16
+
+# Gallery API calls allowed per minute (0 turns pacing off) and the burst allowed on top
+API_RATE_PER_MIN = float(os.environ.get("CIVITFETCH_RATE_PER_MIN", 60))
+API_BURST = max(1, API_RATE_PER_MIN / 6)
+
+# Seconds between progress updates streamed to the UI
+STREAM_INTERVAL = 0.2
+
+# Download requests Gradio runs at once, and how many more may wait in line
+QUEUE_CONCURRENCY = 4
+QUEUE_MAX_SIZE = 32
+
+# Threads Gradio keeps for running handlers; the downloads run on their own pools
+SERVER_THREADS = 16
+
+# Precompiled patterns
+_MODEL_ID_RE = re.compile(r"/models/(\d+)")
+_VERSION_RE = re.compile(r"modelVersionId=(\d+)")
+_FILENAME_RE = re.compile(r'filename="([^"]+)"')
+_INVALID_FILENAME_RE = re.compile(r'[<>:"/\\|?*]')
+_URL_TAIL_RE = re.compile(r'[?#].*$')
+
 # ===[ Utility Functions ]===
+class JitteredRetry(Retry):
+    """Retry whose back-off gets random jitter, so clients don't all retry in lockstep after an outage"""
+    jitter = 0.3
+
+    def get_backoff_time(self):
+        backoff = super().get_backoff_time()
+        return backoff + random.uniform(0, self.jitter) if backoff else backoff
+
+class TokenBucket:
+    """Thread-safe token bucket that paces calls to a steady rate"""
+    def __init__(self, rate_per_min, burst):
+        self.rate = rate_per_min / 60
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """Block until enough tokens have refilled, then take them"""
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            # Sleep outside the lock so other callers can refill and check too
+            time.sleep(wait)
+
+# Shared by every gallery API call in the process, so model info and page
+# requests are paced instead of running into 429 responses and their back-off.
+# Model tab metadata is left unpaced; METADATA_WORKERS bounds it instead
+api_bucket = TokenBucket(API_RATE_PER_MIN, API_BURST)
+
 def create_session(api_key):
     """Create and configure requests session with retries"""
     session = requests.Session()
-    retry = Retry(
+    retry = JitteredRetry(
         total=3,
         backoff_factor=1,
         status_forcelist=[429, 500, 502, 503, 504],
         allowed_methods=["HEAD", "GET", "OPTIONS", "POST"]
     )
-    session.mount("https://", HTTPAdapter(max_retries=retry))
+    session.mount("https://", HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry))
     session.headers.update({
         "User-Agent": "python-requests/2.x",
-        "Authorization": f"Bearer {api_key}"
+        "Authorization": f"Bearer {api_key}",
+        # Ask for compressed JSON explicitly; /models/{id} responses can run past 100 KB
+        "Accept-Encoding": "gzip, deflate"
     })
     return session
 
@@ -53,74 +143,136 @@ def fetch_json(session, path, params=None, timeout=30):
     url = "https://civitai.com/api/v1" + path
     r = session.get(url, params=params, timeout=timeout)
     r.raise_for_status()
-    return r.json()
+    return json_loads(r.content)
+
+# (divisor, decimals, unit) for each power of 1024, indexed by bit_length() // 10
+_SIZE_UNITS = [(1, 0, "B"), (1024, 1, "KB"), (1024**2, 1, "MB"), (1024**3, 2, "GB")]
 
 def format_size(bytes_size):
     """Format file size to appropriate units"""
     if bytes_size < 1024:
         return f"{bytes_size} B"
-    elif bytes_size < 1024**2:
-        return f"{bytes_size/1024:.1f} KB"
-    elif bytes_size < 1024**3:
-        return f"{bytes_size/1024**2:.1f} MB"
-    else:
-        return f"{bytes_size/1024**3:.2f} GB"
+    divisor, decimals, unit = _SIZE_UNITS[min((bytes_size.bit_length() - 1) // 10, 3)]
+    return f"{bytes_size/divisor:.{decimals}f} {unit}"
+
+def write_queued_chunks(f, chunks, errors):
+    """Write chunks from the queue to f until a None sentinel arrives"""
+    while (chunk := chunks.get()) is not None:
+        # After a failed write keep draining so the reader never blocks on a full queue
+        if not errors:
+            try:
+                f.write(chunk)
+            except OSError as e:
+                errors.append(e)
+
+# Paths a download in this process is writing right now. Shared by every
+# worker and every concurrent Gradio event, so two of them never stream into
+# the same file; a path is released once it is on disk under its final name
+_claimed_paths = set()
+_claimed_paths_lock = threading.Lock()
+
+def claim_path(path):
+    """Reserve path for one writer; False if it already exists or another download has it"""
+    with _claimed_paths_lock:
+        if path in _claimed_paths or os.path.exists(path):
+            return False
+        _claimed_paths.add(path)
+        return True
+
+def release_path(path):
+    """Give back a path reserved by claim_path"""
+    with _claimed_paths_lock:
+        _claimed_paths.discard(path)
 
 def download_with_progress(session, url, fallback, out_dir, progress=None):
     """Download file with progress tracking and increased timeout"""
-    for attempt in range(1, 4):
-        try:
-            resp = session.get(url, stream=True, timeout=60)
-            resp.raise_for_status()
-            
-            # Get filename from headers or use fallback
-            cd = resp.headers.get("content-disposition", "")
-            m = re.search(r'filename="([^"]+)"', cd)
-            fname = m.group(1) if m else fallback
-            out_path = os.path.join(out_dir, fname)
-            
-            # Skip if file already exists
-            if os.path.exists(out_path):
-                return f"File already exists, skipping: {fname}"
-            
-            # Download with progress tracking
-            total = int(resp.headers.get("content-length", 0))
-            
-            with open(out_path, "wb") as f:
-                downloaded = 0
-                last_update = 0
-                progress_update_threshold = int(total * 0.25) if total > 0 else 0
+    own_path = None
+    try:
+        for attempt in range(1, 4):
+            try:
+                resp = session.get(url, stream=True, timeout=60)
+                resp.raise_for_status()
                 
-                for chunk in resp.iter_content(8192):
-                    if chunk:
-                        f.write(chunk)
-                        downloaded += len(chunk)
-                        
-                        if total > 0 and (downloaded - last_update > progress_update_threshold or downloaded == total):
-                            last_update = downloaded
-                            progress_pct = int(100 * downloaded / total)
-                            progress(f"Downloading {fname}: {progress_pct}% ({format_size(downloaded)} / {format_size(total)})")
-            
-            return f"Successfully downloaded: {fname}"
-            
-        except RequestException as e:
-            error_msg = f"[Attempt {attempt}/3] download error: {e}"
-            if progress:
-                progress(error_msg)
-            time.sleep(2 ** (attempt-1))
-    
-    return "Download failed after multiple attempts"
+                # Get filename from headers or use fallback
+                cd = resp.headers.get("content-disposition", "")
+                m = _FILENAME_RE.search(cd)
+                fname = m.group(1) if m else fallback
+                out_path = os.path.join(out_dir, fname)
+                
+                # Skip if file already exists or another download is saving it; the
+                # path is reserved before any bytes are written so only one writer gets it
+                if out_path != own_path:
+                    if not claim_path(out_path):
+                        resp.close()
+                        return f"File already exists, skipping: {fname}"
+                    if own_path is not None:
+                        release_path(own_path)
+                    own_path = out_path
+                
+                # Download with progress tracking into a .part file, renamed once
+                # complete so a file under its final name is always whole
+                total = int(resp.headers.get("content-length", 0))
+                part_path = out_path + ".part"
+                
+                with open(part_path, "wb") as f:
+                    downloaded = 0
+                    last_update = 0
+                    progress_update_threshold = int(total * 0.25) if total > 0 else 0
+                    
+                    # A writer thread drains a small queue to disk, so the socket
+                    # keeps being read while the previous chunk is written
+                    chunks = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+                    write_errors = []
+                    writer = threading.Thread(target=write_queued_chunks, args=(f, chunks, write_errors), daemon=True)
+                    writer.start()
+                    
+                    try:
+                        for chunk in resp.iter_content(CHUNK_SIZE):
+                            if chunk:
+                                chunks.put(chunk)
+                                downloaded += len(chunk)
+                                
+                                if total > 0 and (downloaded - last_update > progress_update_threshold or downloaded == total):
+                                    last_update = downloaded
+                                    progress_pct = int(100 * downloaded / total)
+                                    progress(f"Downloading {fname}: {progress_pct}% ({format_size(downloaded)} / {format_size(total)})")
+                    finally:
+                        chunks.put(None)
+                        writer.join()
+                    
+                    if write_errors:
+                        raise write_errors[0]
+                
+                os.replace(part_path, out_path)
+                return f"Successfully downloaded: {fname}"
+                
+            except RequestException as e:
+                error_msg = f"[Attempt {attempt}/3] download error: {e}"
+                if progress:
+                    progress(error_msg)
+                time.sleep(2 ** (attempt-1))
+        
+        # Drop the unfinished file
+        if own_path is not None and os.path.exists(own_path + ".part"):
+            os.remove(own_path + ".part")
+        return "Download failed after multiple attempts"
+    finally:
+        if own_path is not None:
+            release_path(own_path)
 
-def style_excel(filename):
-    """Apply styling to Excel file"""
+# Report columns (metadata keys starting with "_" stay out of the sheet) and their widths
+EXCEL_COLUMNS = ["S.No", "Model ID", "Model Name", "Tags", "Trigger Words", "Base Model",
+                 "SHA256", "AutoV1", "File Size", "NSFW", "Status"]
+EXCEL_COLUMN_WIDTHS = [8, 12, 40, 30, 50, 15, 20, 20, 15, 8, 30]
+
+def write_excel(filename, rows):
+    """Write metadata rows to a styled Excel file in a single pass"""
     import openpyxl
-    from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, Alignment, PatternFill, Border, Side, NamedStyle
     from openpyxl.utils import get_column_letter
     
-    wb = openpyxl.load_workbook(filename)
-    ws = wb.active
-    
-    # Define styles
+    # Define styles once; every cell shares these objects
     header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
     header_font = Font(name="Calibri", size=12, bold=True, color="FFFFFF")
     success_fill = PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid")
@@ -130,64 +282,72 @@ def style_excel(filename):
         left=Side(style='thin'), right=Side(style='thin'), 
         top=Side(style='thin'), bottom=Side(style='thin')
     )
+    center = Alignment(horizontal='center', vertical='center')
+    vcenter = Alignment(vertical='center')
     
-    # Style header row
-    for col in range(1, ws.max_column + 1):
-        cell = ws.cell(row=1, column=col)
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal='center', vertical='center')
-    
-    # Style data rows
-    for row in range(2, ws.max_row + 1):
-        for col in range(1, ws.max_column + 1):
-            cell = ws.cell(row=row, column=col)
-            cell.border = border
-            cell.alignment = Alignment(vertical='center')
-            
-            # Center-align certain columns
-            if col in [1, 2]:
-                cell.alignment = Alignment(horizontal='center', vertical='center')
-        
-        # Apply conditional formatting
-        status_cell = ws.cell(row=row, column=ws.max_column)
-        if "Success" in str(status_cell.value):
-            status_cell.fill = success_fill
-        elif "Failed" in str(status_cell.value) or "ERROR" in str(status_cell.value):
-            status_cell.fill = error_fill
-        elif "Skipped" in str(status_cell.value):
-            status_cell.fill = skip_fill
-    
-    # Adjust column widths
-    column_widths = [8, 12, 40, 30, 50, 15, 20, 20, 15, 8, 30]
-    for col, width in enumerate(column_widths[:ws.max_column], 1):
+    # Count statuses and pick each status cell's fill in one pass
+    success_count = failed_count = skipped_count = 0
+    status_fills = []
+    for row in rows:
+        status = str(row["Status"])
+        fill = None
+        if "Success" in status:
+            success_count += 1
+            fill = success_fill
+        elif "Failed" in status or "ERROR" in status:
+            failed_count += 1
+            fill = error_fill
+        elif "Skipped" in status:
+            skipped_count += 1
+            fill = skip_fill
+        status_fills.append(fill)
+    
+    # Write-only mode streams rows straight to disk; column widths, frozen
+    # panes and merged cells have to be declared before the first row
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Sheet1")
+    for col, width in enumerate(EXCEL_COLUMN_WIDTHS, 1):
         ws.column_dimensions[get_column_letter(col)].width = width
+    ws.freeze_panes = "A4"
+    ws.merged_cells.add(f"A1:{get_column_letter(len(EXCEL_COLUMNS))}1")
+    
+    # Data cells take border and alignment from one registered named style
+    # (S.No and Model ID are center-aligned) instead of setting each attribute per cell
+    wb.add_named_style(NamedStyle(name="data_center", border=border, alignment=center))
+    wb.add_named_style(NamedStyle(name="data_row", border=border, alignment=vcenter))
+    data_styles = ["data_center" if col in (1, 2) else "data_row" for col in range(1, len(EXCEL_COLUMNS) + 1)]
     
-    # Freeze header row
-    ws.freeze_panes = "A2"
-    
-    # Add summary at the top
-    ws.insert_rows(1, 2)
-    ws.merge_cells('A1:K1')
-    summary_cell = ws.cell(row=1, column=1)
-    
-    # Count statuses
-    total_models = ws.max_row - 3
-    success_count = sum(1 for row in range(4, ws.max_row + 1) 
-                      if "Success" in str(ws.cell(row=row, column=ws.max_column).value or ""))
-    failed_count = sum(1 for row in range(4, ws.max_row + 1) 
-                     if any(x in str(ws.cell(row=row, column=ws.max_column).value or "") 
-                            for x in ["Failed", "ERROR"]))
-    skipped_count = sum(1 for row in range(4, ws.max_row + 1) 
-                      if "Skipped" in str(ws.cell(row=row, column=ws.max_column).value or ""))
-    
-    summary_cell.value = f"CivitAI Models Summary | Total: {total_models} | Success: {success_count} | Failed: {failed_count} | Skipped: {skipped_count} | Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}"
+    # Add summary at the top, then a spacer row
+    summary_cell = WriteOnlyCell(ws, value=f"CivitAI Models Summary | Total: {len(rows)} | Success: {success_count} | Failed: {failed_count} | Skipped: {skipped_count} | Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}")
     summary_cell.font = Font(name="Calibri", size=12, bold=True)
     summary_cell.fill = PatternFill(start_color="D9E1F2", end_color="D9E1F2", fill_type="solid")
-    summary_cell.alignment = Alignment(horizontal='center', vertical='center')
+    summary_cell.alignment = center
     summary_cell.border = border
+    ws.append([summary_cell])
+    ws.append([])
+    
+    # Header row
+    header_cells = []
+    for header in EXCEL_COLUMNS:
+        cell = WriteOnlyCell(ws, value=header)
+        cell.fill = header_fill
+        cell.font = header_font
+        cell.alignment = center
+        header_cells.append(cell)
+    ws.append(header_cells)
+    
+    # Data rows with borders and conditional status formatting
+    for row, fill in zip(rows, status_fills):
+        cells = []
+        for key, style in zip(EXCEL_COLUMNS, data_styles):
+            cell = WriteOnlyCell(ws, value=row[key])
+            cell.style = style
+            cells.append(cell)
+        
+        if fill:
+            cells[-1].fill = fill
+        ws.append(cells)
     
-    # Save the styled workbook
     wb.save(filename)
     return filename
 
@@ -199,22 +359,26 @@ def detect_nsfw_from_tags(tags, nsfw_flag=False):
     if not tags:
         return "SFW"
     
-    # Check if any tag contains "nsfw" (case insensitive)
-    for tag in tags:
-        if isinstance(tag, str) and "nsfw" in tag.lower():
-            return "NSFW"
+    # Check if any tag contains "nsfw" (case insensitive); joining first lowers
+    # all tags in one call instead of allocating a lowered copy per tag
+    try:
+        joined_tags = "\n".join(tags)
+    except TypeError:
+        joined_tags = "\n".join(tag for tag in tags if isinstance(tag, str))
+    if "nsfw" in joined_tags.lower():
+        return "NSFW"
     
     return "SFW"
 
 def sanitize_filename(name):
     """Sanitize string for use as filename."""
-    sanitized = re.sub(r'[<>:"/\\|?*]', '_', name)
+    sanitized = _INVALID_FILENAME_RE.sub('_', name)
     return sanitized[:100]
 
 def parse_url(url):
     """Parse model ID and version ID from URL."""
-    model_match = re.search(r"/models/(\d+)", url)
-    version_match = re.search(r"modelVersionId=(\d+)", url)
+    model_match = _MODEL_ID_RE.search(url)
+    version_match = _VERSION_RE.search(url)
     
     if not model_match:
         raise ValueError("Error: Invalid model URL format. Expected URL like https://civitai.com/models/XXXXX")
@@ -225,8 +389,26 @@ def parse_url(url):
     return model_id, version_id
 
 # ===[ Model Download Functions ]===
-def handle_model_download_new(api_key, mode, model_input, file_input, nsfw_choice):
-    """Process model download request"""
+@lru_cache(maxsize=8)
+def read_model_ids(path, signature):
+    """Parse a bulk URL file into (unique model IDs, entry count); signature is (mtime, size) so edited files are re-read"""
+    with open(path, "r", encoding="utf-8") as f:
+        entries = [line.strip() for line in f if line.strip()]
+    
+    seen_ids = set()
+    model_ids = []
+    for entry in entries:
+        m = _MODEL_ID_RE.search(entry)
+        model_id = m.group(1) if m else entry
+        
+        if model_id not in seen_ids:
+            seen_ids.add(model_id)
+            model_ids.append(model_id)
+    
+    return tuple(model_ids), len(entries)
+
+def run_model_download(api_key, mode, model_input, file_input, nsfw_choice, progress_lines):
+    """Process model download request, appending progress to progress_lines"""
     # Translate nsfw_choice to Yes/No for compatibility with existing function
     nsfw_toggle = "Yes" if nsfw_choice == "NSFW Included" else "No"
     
@@ -237,11 +419,10 @@ def handle_model_download_new(api_key, mode, model_input, file_input, nsfw_choic
     # Create session
     session = create_session(api_key)
     
-    progress_text = ""
-    
+    # Collect lines in a list and join once; list.append is also safe to call
+    # from the download workers without a lock
     def progress_callback(text):
-        nonlocal progress_text
-        progress_text += text + "\n"
+        progress_lines.append(text + "\n")
     
     # Extract model IDs based on mode
     unique_model_ids = []
@@ -250,7 +431,7 @@ def handle_model_download_new(api_key, mode, model_input, file_input, nsfw_choic
         try:
             progress_callback("Parsing model URL...")
             # Extract numeric model ID from URL or accept ID
-            m = re.search(r"/models/(\d+)", model_input)
+            m = _MODEL_ID_RE.search(model_input)
             model_id = m.group(1) if m else model_input.strip()
             unique_model_ids.append(model_id)
         except Exception as e:
@@ -258,22 +439,16 @@ def handle_model_download_new(api_key, mode, model_input, file_input, nsfw_choic
     else:  # bulk mode
         try:
             progress_callback("Reading model URLs from file...")
-            with open(file_input, "r", encoding="utf-8") as f:
-                entries = [line.strip() for line in f if line.strip()]
+            # Re-clicking with the same upload (e.g. after changing the NSFW filter) reuses the parsed IDs
+            stat = os.stat(file_input)
+            model_ids, entry_count = read_model_ids(file_input, (stat.st_mtime_ns, stat.st_size))
                 
-            if not entries:
+            if not entry_count:
                 return "No models found in the uploaded file."
                 
-            seen_ids = set()
-            for entry in entries:
-                m = re.search(r"/models/(\d+)", entry)
-                model_id = m.group(1) if m else entry
-                
-                if model_id not in seen_ids:
-                    seen_ids.add(model_id)
-                    unique_model_ids.append(model_id)
+            unique_model_ids.extend(model_ids)
                     
-            progress_callback(f"Found {len(unique_model_ids)} unique models out of {len(entries)} entries.")
+            progress_callback(f"Found {len(unique_model_ids)} unique models out of {entry_count} entries.")
         except Exception as e:
             return f"Error processing file: {str(e)}"
     
@@ -286,82 +461,87 @@ def handle_model_download_new(api_key, mode, model_input, file_input, nsfw_choic
     # Phase 1: Collect metadata
     progress_callback("\n===== PHASE 1: COLLECTING METADATA =====")
     
-    for idx, model_id in enumerate(unique_model_ids, 1):
-        progress_callback(f"\nFetching metadata {idx}/{len(unique_model_ids)}: ID {model_id}")
+    # Fetch all metadata concurrently and process each result in input order
+    # as soon as it arrives, so progress streams while later fetches run
+    with ThreadPoolExecutor(max_workers=METADATA_WORKERS) as executor:
+        futures = [executor.submit(fetch_json, session, f"/models/{model_id}") for model_id in unique_model_ids]
         
-        try:
-            md = fetch_json(session, f"/models/{model_id}")
-            
-            # Extract version and file info
-            ver = md["modelVersions"][0]
-            file0 = ver["files"][0]
-            hashes = file0.get("hashes", {})
-            
-            # Extract basic fields
-            model_name = md.get("name", "—")
-            trigger_words = ver.get("trainedWords", [])
-            base_model = ver.get("baseModel", "—")
-            sha256_hash = hashes.get("SHA256", "—")
-            autov1_hash = hashes.get("AutoV1", "—")
-            file_size = file0.get("sizeKB", 0)
-            file_size_formatted = f"{file_size/1024:.2f} MB" if file_size else "—"
-            
-            # Extract tags and check for NSFW
-            tags = md.get("tags", [])
-            is_nsfw_flagged = md.get("nsfw", False)
-            nsfw_status = detect_nsfw_from_tags(tags, is_nsfw_flagged)
+        for idx, (model_id, future) in enumerate(zip(unique_model_ids, futures), 1):
+            progress_callback(f"\nFetching metadata {idx}/{len(unique_model_ids)}: ID {model_id}")
             
-            model_data = {
-                "S.No": idx,
-                "Model ID": model_id,
-                "Model Name": model_name,
-                "Tags": ", ".join(tags) if tags else "—",
-                "Trigger Words": "; ".join(trigger_words) or "—",
-                "Base Model": base_model,
-                "SHA256": sha256_hash,
-                "AutoV1": autov1_hash,
-                "File Size": file_size_formatted,
-                "NSFW": nsfw_status,
-                "Status": "Pending",
-                # Hidden metadata for download phase
-                "_download_url": file0["downloadUrl"] + f"?token={api_key}",
-                "_filename": sanitize_filename(f"{model_name}.safetensors"),
-                "_is_nsfw": is_nsfw_flagged or nsfw_status == "NSFW"
-            }
-            
-            # Check NSFW policy - separate NSFW models
-            if nsfw_status == "NSFW":
-                if download_nsfw:
-                    progress_callback(f"  Model '{model_name}' is NSFW. Will download based on your preference.")
-                    valid_models.append(model_data)
-                    nsfw_models.append(model_data)
+            try:
+                md = future.result()
+                
+                # Extract version and file info
+                ver = md["modelVersions"][0]
+                file0 = ver["files"][0]
+                hashes = file0.get("hashes", {})
+                
+                # Extract basic fields
+                model_name = md.get("name", "—")
+                trigger_words = ver.get("trainedWords", [])
+                base_model = ver.get("baseModel", "—")
+                sha256_hash = hashes.get("SHA256", "—")
+                autov1_hash = hashes.get("AutoV1", "—")
+                file_size = file0.get("sizeKB", 0)
+                file_size_formatted = f"{file_size/1024:.2f} MB" if file_size else "—"
+                
+                # Extract tags and check for NSFW
+                tags = md.get("tags", [])
+                is_nsfw_flagged = md.get("nsfw", False)
+                nsfw_status = detect_nsfw_from_tags(tags, is_nsfw_flagged)
+                
+                model_data = {
+                    "S.No": idx,
+                    "Model ID": model_id,
+                    "Model Name": model_name,
+                    "Tags": ", ".join(tags) if tags else "—",
+                    "Trigger Words": "; ".join(trigger_words) or "—",
+                    "Base Model": base_model,
+                    "SHA256": sha256_hash,
+                    "AutoV1": autov1_hash,
+                    "File Size": file_size_formatted,
+                    "NSFW": nsfw_status,
+                    "Status": "Pending",
+                    # Hidden metadata for download phase
+                    "_download_url": file0["downloadUrl"],  # authenticated by the session's Bearer header
+                    "_filename": sanitize_filename(f"{model_name}.safetensors"),
+                    "_is_nsfw": is_nsfw_flagged or nsfw_status == "NSFW"
+                }
+                
+                # Check NSFW policy - separate NSFW models
+                if nsfw_status == "NSFW":
+                    if download_nsfw:
+                        progress_callback(f"  Model '{model_name}' is NSFW. Will download based on your preference.")
+                        valid_models.append(model_data)
+                        nsfw_models.append(model_data)
+                    else:
+                        progress_callback(f"  Model '{model_name}' is NSFW. Skipping based on your preference.")
+                        model_data["Status"] = "Skipped (NSFW)"
+                        nsfw_models.append(model_data)  # Add to NSFW list, not all_metadata
                 else:
-                    progress_callback(f"  Model '{model_name}' is NSFW. Skipping based on your preference.")
-                    model_data["Status"] = "Skipped (NSFW)"
-                    nsfw_models.append(model_data)  # Add to NSFW list, not all_metadata
-            else:
-                # SFW model - always add to valid and all list
-                progress_callback(f"  Got metadata for '{model_name}' ({base_model}, {file_size_formatted})")
-                valid_models.append(model_data)
-                all_metadata.append(model_data)
-            
-        except Exception as e:
-            progress_callback(f"  Failed to fetch metadata: {e}")
-            error_model = {
-                "S.No": idx,
-                "Model ID": model_id,
-                "Model Name": "ERROR - Failed to fetch",
-                "Tags": "—",
-                "Trigger Words": "—",
-                "Base Model": "—",
-                "SHA256": "—",
-                "AutoV1": "—",
-                "File Size": "—",
-                "NSFW": "—",
-                "Status": f"Failed: {str(e)}",
-            }
-            all_metadata.append(error_model)
-            continue
+                    # SFW model - always add to valid and all list
+                    progress_callback(f"  Got metadata for '{model_name}' ({base_model}, {file_size_formatted})")
+                    valid_models.append(model_data)
+                    all_metadata.append(model_data)
+                
+            except Exception as e:
+                progress_callback(f"  Failed to fetch metadata: {e}")
+                error_model = {
+                    "S.No": idx,
+                    "Model ID": model_id,
+                    "Model Name": "ERROR - Failed to fetch",
+                    "Tags": "—",
+                    "Trigger Words": "—",
+                    "Base Model": "—",
+                    "SHA256": "—",
+                    "AutoV1": "—",
+                    "File Size": "—",
+                    "NSFW": "—",
+                    "Status": f"Failed: {str(e)}",
+                }
+                all_metadata.append(error_model)
+                continue
     
     # Add NSFW models to all_metadata only if downloading NSFW
     if download_nsfw and nsfw_models:
@@ -373,118 +553,197 @@ def handle_model_download_new(api_key, mode, model_input, file_input, nsfw_choic
         
         # Only create Excel if we have models to report
         if all_metadata:
-            display_metadata = []
-            for item in all_metadata:
-                display_item = {k: v for k, v in item.items() if not k.startswith("_")}
-                display_metadata.append(display_item)
-                
-            df = pd.DataFrame(display_metadata)
             excel_filename = f"CivitData/{len(all_metadata)}_models_report.xlsx"
-            df.to_excel(excel_filename, index=False, engine='openpyxl')
-            styled_file = style_excel(excel_filename)
+            styled_file = write_excel(excel_filename, all_metadata)
             progress_callback(f"Created report for models: {styled_file}")
         
-        return progress_text
+        return "".join(progress_lines)
     
     # Generate initial Excel file
     progress_callback("\nCreating initial metadata Excel file...")
     
-    # Remove internal fields for Excel display
-    display_metadata = []
-    for item in all_metadata:
-        display_item = {k: v for k, v in item.items() if not k.startswith("_")}
-        display_metadata.append(display_item)
-    
-    df = pd.DataFrame(display_metadata)
+    # write_excel only reads EXCEL_COLUMNS, so the internal "_" fields never reach the sheet
     excel_filename = f"CivitData/{len(valid_models)}_models.xlsx"
-    df.to_excel(excel_filename, index=False, engine='openpyxl')
-    styled_file = style_excel(excel_filename)
+    styled_file = write_excel(excel_filename, all_metadata)
     progress_callback(f"  Created initial metadata Excel file: {styled_file}")
     
     # Phase 2: Download models
     progress_callback("\n===== PHASE 2: DOWNLOADING MODELS =====")
     
-    for idx, model_data in enumerate(valid_models, 1):
-        model_id = model_data["Model ID"]
-        model_name = model_data["Model Name"]
-        dl_url = model_data.get("_download_url")
-        filename = model_data.get("_filename")
-        
-        progress_callback(f"\nProcessing download {idx}/{len(valid_models)}: {model_name} (ID: {model_id})")
-        
-        # Download file
-        result = download_with_progress(session, dl_url, filename, "CivitModels", progress_callback)
+    def download_model(idx, model_data):
+        progress_callback(f"\nProcessing download {idx}/{len(valid_models)}: {model_data['Model Name']} (ID: {model_data['Model ID']})")
+        result = download_with_progress(session, model_data.get("_download_url"), model_data.get("_filename"), "CivitModels", progress_callback)
         progress_callback(result)
-        
-        if "Successfully" in result:
-            model_data["Status"] = f"Success - {filename}"
-        elif "already exists" in result:
-            model_data["Status"] = f"Skipped (Already exists)"
-        else:
-            model_data["Status"] = f"Failed: {result}"
+        return result
+    
+    # Run several downloads at once; map() hands results back in input order
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+        results = executor.map(download_model, range(1, len(valid_models) + 1), valid_models)
+        for model_data, result in zip(valid_models, results):
+            filename = model_data.get("_filename")
+            
+            if "Successfully" in result:
+                model_data["Status"] = f"Success - {filename}"
+            elif "already exists" in result:
+                model_data["Status"] = f"Skipped (Already exists)"
+            else:
+                model_data["Status"] = f"Failed: {result}"
     
     # Generate final Excel file
     progress_callback("\nCreating final metadata Excel file with download statuses...")
     
-    # Remove internal fields for Excel display again
-    final_display_metadata = []
-    for item in all_metadata:
-        display_item = {k: v for k, v in item.items() if not k.startswith("_")}
-        final_display_metadata.append(display_item)
-    
-    df = pd.DataFrame(final_display_metadata)
-    df.to_excel(excel_filename, index=False, engine='openpyxl')
-    styled_file = style_excel(excel_filename)
+    styled_file = write_excel(excel_filename, all_metadata)
     progress_callback(f"  Created final metadata Excel file: {styled_file}")
     
     final_message = f"All tasks complete! Downloaded models are in 'CivitModels' folder. Report available at {styled_file}"
     progress_callback(final_message)
     
-    return progress_text
+    return "".join(progress_lines)
+
+def handle_model_download_new(api_key, mode, model_input, file_input, nsfw_choice):
+    """Process model download request from the Gradio interface, streaming progress as it runs"""
+    progress_lines = []
+    outcome = {}
+    
+    def run():
+        try:
+            outcome["text"] = run_model_download(api_key, mode, model_input, file_input, nsfw_choice, progress_lines)
+        except Exception as e:
+            outcome["error"] = e
+    
+    # The job runs on its own thread so progress can be yielded to the UI while it works
+    worker = threading.Thread(target=run, daemon=True)
+    worker.start()
+    while True:
+        worker.join(STREAM_INTERVAL)
+        if not worker.is_alive():
+            break
+        yield "".join(progress_lines)
+    
+    if "error" in outcome:
+        raise outcome["error"]
+    yield outcome["text"]
 
 # ===[ Image Download Function ]===    
 ROOT_FOLDER = "CivitImg"
 API_BASE = "https://civitai.com/api/v1"
-MAX_RETRIES = 3
-RETRY_DELAY = 10
+MAX_RETRIES = 6
 REQUEST_TIMEOUT = 30
 
-# ===[ Print Capture System ]===
-# Ensure this class is defined before it's used
-class PrintCapture:
-    def __init__(self):
-        self.buffer = []
-
-    def write(self, text):
-        # Capture standard output and errors
-        self.buffer.append(str(text))
+# Gallery API filter for each Image tab content choice; "All" omits the nsfw parameter
+_NSFW_FILTERS = {
+    "NSFW Only": {'nsfw': 'true'},
+    "SFW Only": {'nsfw': 'false'},
+    "All": {},
+}
+
+# One adapter for every gallery request in the process, so connections to
+# civitai.com stay open across button clicks instead of re-handshaking.
+# It retries timeouts, rate limits, Cloudflare timeouts and server errors
+# with jittered exponential back-off (honouring Retry-After); raise_on_status=False
+# hands the last response back so make_api_request can report it.
+IMAGE_ADAPTER = HTTPAdapter(
+    # Room for every image worker of every gallery request Gradio runs at once;
+    # pool_block makes any extra thread wait for a connection instead of
+    # opening one that would be thrown away afterwards
+    pool_connections=POOL_SIZE,
+    pool_maxsize=IMAGE_WORKERS * QUEUE_CONCURRENCY,
+    pool_block=True,
+    max_retries=JitteredRetry(
+        total=MAX_RETRIES,
+        backoff_factor=0.5,
+        status_forcelist=[408, 425, 429, 500, 502, 503, 504, 524],
+        allowed_methods=["GET", "HEAD"],
+        raise_on_status=False
+    )
+)
 
-    def flush(self):
-        # Required for file-like object interface
+# ===[ API Response Cache ]===
+# Gallery API responses are cached on disk so re-running the same model skips
+# the metadata and page requests. CIVITFETCH_CACHE_MODE picks the behaviour:
+#   enabled   - read fresh entries, store new responses (default)
+#   read-only - read fresh entries, never store
+#   replay    - read entries regardless of age, never touch the network
+#   disabled  - always go to the network
+CACHE_DIR = os.path.join("CivitData", ".httpcache")
+CACHE_TTL = 24 * 60 * 60
+CACHE_MODE = os.environ.get("CIVITFETCH_CACHE_MODE", "enabled").strip().lower()
+
+def cache_path(api_key, url, params=None):
+    """Return the cache file for a request; the API key is part of the key since results depend on account settings"""
+    key = "\n".join([api_key, url, *(f"{k}={v}" for k, v in sorted((params or {}).items()))])
+    return os.path.join(CACHE_DIR, hashlib.sha256(key.encode("utf-8")).hexdigest() + ".json")
+
+def load_cached_response(path):
+    """Return the cached response body, or None if missing, stale or caching is off"""
+    if CACHE_MODE not in ("enabled", "read-only", "replay"):
+        return None
+    try:
+        if CACHE_MODE != "replay" and time.time() - os.path.getmtime(path) > CACHE_TTL:
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+def store_cached_response(path, body):
+    """Write a response body to the cache; failures only cost a cache miss later"""
+    if CACHE_MODE != "enabled":
+        return
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        part_path = f"{path}.{threading.get_ident()}.part"
+        with open(part_path, "wb") as f:
+            f.write(body)
+        os.replace(part_path, path)
+    except OSError:
         pass
 
-    def get_output(self):
-        return "".join(self.buffer)
+# ===[ Image Download Logging ]===
+# Gallery progress is logged here; each request attaches its own in-memory
+# handler, so nothing is captured by redirecting sys.stdout
+image_logger = logging.getLogger("civitfetch.image")
+image_logger.setLevel(logging.INFO)
+image_logger.propagate = False
+
+# Most recent log lines kept per request
+LOG_BUFFER_LINES = 2000
 
-    def clear(self):
-        self.buffer = []
+class RingBufferHandler(logging.Handler):
+    """Keeps the most recent formatted log lines of one request in memory"""
+    def __init__(self, maxlen=LOG_BUFFER_LINES):
+        super().__init__()
+        self.lines = deque(maxlen=maxlen)
 
-# Instantiate PrintCapture globally or where accessible by handle_image_download
-output_capture = PrintCapture()
+    def emit(self, record):
+        self.lines.append(self.format(record) + "\n")
+
+    def get_output(self):
+        # Hold the handler lock so a worker thread can't append mid-join
+        self.acquire()
+        try:
+            return "".join(self.lines)
+        finally:
+            self.release()
 
 # ===[ Image Download Class ]===
 class CivitaiDownloader:
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, logger=image_logger):
         self.api_key = api_key
         self.headers = {'Authorization': f'Bearer {api_key}'}
-        # Use the PrintCapture instance for logging within the class
-        self.logger = output_capture
+        # Sessions are per downloader (the API key goes in per-request headers),
+        # but all of them share IMAGE_ADAPTER's connection pool
+        self.session = requests.Session()
+        self.session.mount("https://", IMAGE_ADAPTER)
+        self.session.mount("http://", IMAGE_ADAPTER)
+        # Logger (or per-request LoggerAdapter) for all progress messages
+        self.logger = logger
         os.makedirs(ROOT_FOLDER, exist_ok=True)
 
     def parse_url(self, url: str) -> Tuple[str, Optional[str]]:
         """Parse model ID and version ID from URL."""
-        model_match = re.search(r"/models/(\d+)", url)
-        version_match = re.search(r"modelVersionId=(\d+)", url)
+        model_match = _MODEL_ID_RE.search(url)
+        version_match = _VERSION_RE.search(url)
 
         if not model_match:
             raise ValueError("Invalid model URL format. Expected like https://civitai.com/models/XXXXX")
@@ -515,7 +774,7 @@ class CivitaiDownloader:
                 "version_name": version_name # Can be None if no version_id was passed
             }
         except Exception as e:
-            self.logger.write(f"Error fetching model info: {str(e)}\n")
+            self.logger.info(f"Error fetching model info: {str(e)}")
             # Provide default names even on error to allow download attempt
             return {
                 "model_name": f"model_{model_id}",
@@ -525,52 +784,103 @@ class CivitaiDownloader:
     def sanitize_filename(self, name: str) -> str:
         """Sanitize string for use as filename."""
         # Remove invalid characters
-        sanitized = re.sub(r'[<>:"/\\|?*]', '_', name)
+        sanitized = _INVALID_FILENAME_RE.sub('_', name)
         # Remove leading/trailing whitespace and dots
         sanitized = sanitized.strip('. ')
         # Limit length
         return sanitized[:150] # Increased length slightly for potentially long names
 
     def make_api_request(self, endpoint: str, params: Dict[str, Any] = None) -> Optional[Dict]:
-        """Make API request with retry logic."""
+        """Make API request; retries and back-off are handled by the session adapter."""
         url = f"{API_BASE}/{endpoint}"
-        retries = 0
 
-        while retries < MAX_RETRIES:
+        cached_file = cache_path(self.api_key, url, params)
+        cached = load_cached_response(cached_file)
+        if cached is not None:
             try:
-                response = requests.get(
-                    url,
-                    headers=self.headers,
-                    params=params,
-                    timeout=REQUEST_TIMEOUT
-                )
-
-                if response.status_code == 200:
-                    return response.json()
-                elif response.status_code in [401, 403]:
-                     self.logger.write(f"API Authentication Error: {response.status_code}. Check your API key.\n")
-                     return None # Authentication errors are fatal
-                elif response.status_code in [429, 524]: # Rate limit or Cloudflare timeout
-                    wait_time = int(response.headers.get('Retry-After', RETRY_DELAY))
-                    self.logger.write(f"Rate limit or timeout ({response.status_code}). Waiting {wait_time}s (Attempt {retries + 1}/{MAX_RETRIES})\n")
-                    time.sleep(wait_time)
-                    retries += 1
-                elif response.status_code >= 500: # Server errors
-                    self.logger.write(f"Server error ({response.status_code}). Retrying in {RETRY_DELAY}s (Attempt {retries + 1}/{MAX_RETRIES})\n")
-                    retries += 1
-                    time.sleep(RETRY_DELAY * (retries)) # Exponential backoff might be better
-                else: # Other client errors (404 Not Found, etc.)
-                    self.logger.write(f"API Client Error: {response.status_code} for URL {response.url}. Params: {params}\nResponse: {response.text[:200]}\n")
-                    return None # Assume non-retryable client errors are fatal
-
-            except (ConnectionError, Timeout) as e:
-                self.logger.write(f"Connection error: {str(e)}. Retrying in {RETRY_DELAY}s (Attempt {retries + 1}/{MAX_RETRIES})\n")
-                retries += 1
-                time.sleep(RETRY_DELAY * (retries)) # Exponential backoff
-
-        self.logger.write(f"Max retries exceeded for endpoint {endpoint}.\n")
-        return None # Return None after exceeding retries
+                return json_loads(cached)
+            except ValueError:
+                pass # Corrupt entry; fetch it again
+        if CACHE_MODE == "replay":
+            self.logger.info(f"No cached response for endpoint {endpoint} (replay mode).")
+            return None
+
+        api_bucket.acquire()
+        try:
+            response = self.session.get(
+                url,
+                headers=self.headers,
+                params=params,
+                timeout=REQUEST_TIMEOUT
+            )
+        except (ConnectionError, Timeout) as e:
+            self.logger.info(f"Connection error after {MAX_RETRIES} retries: {str(e)}")
+            return None
+
+        if response.status_code == 200:
+            data = json_loads(response.content)
+            store_cached_response(cached_file, response.content)
+            return data
+        elif response.status_code in [401, 403]:
+             self.logger.info(f"API Authentication Error: {response.status_code}. Check your API key.")
+             return None # Authentication errors are fatal
+        elif response.status_code in [429, 524] or response.status_code >= 500: # Still failing once retries ran out
+            self.logger.info(f"Max retries exceeded for endpoint {endpoint} (last status {response.status_code}).")
+            return None
+        else: # Other client errors (404 Not Found, etc.)
+            self.logger.info(f"API Client Error: {response.status_code} for URL {response.url}. Params: {params}\nResponse: {response.text[:200]}")
+            return None # Assume non-retryable client errors are fatal
+
+    def _download_one_image(self, img_id, img_url: str, img_path: str) -> bool:
+        """Download a single gallery image, returning True on success."""
+        # Write to a .part file and rename when complete, so an image that exists
+        # under its final name is always whole and reruns can skip it without a request
+        part_path = img_path + ".part"
+        # Another gallery request for the same model may be saving this image right now
+        if not claim_path(img_path):
+            self.logger.info(f"Image ID {img_id} is already saved or being saved by another download, skipping.")
+            return False
+        try:
+            # Use stream=True for potentially large images; the with-block hands the connection back to the pool
+            with self.session.get(img_url, timeout=REQUEST_TIMEOUT, stream=True) as img_response:
+                img_response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
+
+                with open(part_path, 'wb') as f:
+                    for chunk in img_response.iter_content(chunk_size=CHUNK_SIZE):
+                        f.write(chunk)
+            os.replace(part_path, img_path)
+            return True
+
+        except requests.exceptions.RequestException as e:
+            self.logger.info(f"Error downloading image ID {img_id} from {img_url}: {str(e)}")
+            # Remove the partially downloaded file if error occurs
+            if os.path.exists(part_path):
+                try:
+                    os.remove(part_path)
+                except OSError as rm_err:
+                    self.logger.info(f"Could not remove partial file {part_path}: {rm_err}")
+            return False
+        finally:
+            release_path(img_path)
+
+    def _download_queued_images(self, work, downloaded: List, processed_image_ids: set) -> None:
+        """Download queued (img_id, url, path) items until a None sentinel arrives."""
+        while (item := work.get()) is not None:
+            img_id = item[0]
+            try:
+                ok = self._download_one_image(*item)
+            except OSError as e:
+                self.logger.info(f"Error saving image ID {img_id}: {str(e)}")
+                ok = False
+            if ok:
+                downloaded.append(img_id)
+            else:
+                processed_image_ids.discard(img_id) # Only successful downloads stay marked as processed
 
+    def fetch_gallery_page(self, params: Dict[str, Any]) -> Optional[Dict]:
+        """Fetch one page of gallery image data."""
+        self.logger.info(f"Fetching gallery page {params['page']}...")
+        return self.make_api_request('images', params)
 
     def download_gallery(self, model_id: str, version_id: Optional[str], model_name: str, filters: Dict[str, str]):
         """Download all images from model's gallery using pagination until no more items are returned."""
@@ -593,178 +903,245 @@ class CivitaiDownloader:
 
         model_folder = os.path.join(ROOT_FOLDER, model_folder_name)
         os.makedirs(model_folder, exist_ok=True)
-        self.logger.write(f"Saving images to folder: {model_folder}\n")
+        self.logger.info(f"Saving images to folder: {model_folder}")
 
-        total_downloaded = 0
-        processed_image_ids = set() # Keep track of downloaded image IDs to prevent duplicates across pages
-
-        while True: # Loop indefinitely until explicitly broken
-            self.logger.write(f"Fetching gallery page {params['page']}...\n")
-            images_data = self.make_api_request('images', params)
-
-            # Handle API request failure gracefully
-            if images_data is None:
-                 self.logger.write(f"Failed to fetch image data for page {params['page']}. Stopping download for this model.\n")
-                 break
-
-            images = images_data.get('items', [])
-            if not images:
-                # This is the key condition: stop if the API returns an empty list for the current page
-                self.logger.write("No more images found on this page or subsequent pages.\n")
-                break
-
-            page_download_count = 0
-            for img in images:
-                img_id = img.get('id')
-                img_url = img.get('url')
-
-                # Skip if no URL or if image ID has already been processed (handles potential API pagination overlap)
-                if not img_url or not img_id:
-                    self.logger.write(f"Skipping image data with missing URL or ID: {img}\n")
-                    continue
-
-                if img_id in processed_image_ids:
-                     self.logger.write(f"Image ID {img_id} already processed, skipping (potential duplicate).\n")
-                     continue
-
-                # Determine filename (ensure unique name using image ID)
-                # Try to get extension from URL, default to jpg
-                url_parts = img_url.split('.')
-                img_extension = url_parts[-1].lower() if len(url_parts) > 1 and len(url_parts[-1]) <= 4 else 'jpg'
-                # Sanitize potentially included parameters in URL extension part
-                img_extension = re.sub(r'[?#].*$', '', img_extension)
-                if img_extension not in ['jpg', 'jpeg', 'png', 'webp', 'gif']: # Basic check for valid extensions
-                    self.logger.write(f"Warning: Unusual extension '{img_extension}' for image ID {img_id}. Defaulting to '.jpg'. URL: {img_url}\n")
-                    img_extension = 'jpg'
-
-                img_name = f"img_{img_id}.{img_extension}"
-                # Sanitize the final generated filename
-                safe_img_name = self.sanitize_filename(img_name)
-                img_path = os.path.join(model_folder, safe_img_name)
-
-                if os.path.exists(img_path):
-                    # self.logger.write(f"Image {safe_img_name} already exists, skipping.\n") # Less verbose logging
-                    processed_image_ids.add(img_id) # Still mark as processed
-                    continue
-
-                # Download the image
-                # self.logger.write(f"Downloading {safe_img_name}...\n") # Less verbose logging
-                try:
-                    img_response = requests.get(img_url, timeout=REQUEST_TIMEOUT, stream=True) # Use stream=True for potentially large images
-                    img_response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
-
-                    with open(img_path, 'wb') as f:
-                        for chunk in img_response.iter_content(chunk_size=8192):
-                            f.write(chunk)
-
-                    total_downloaded += 1
-                    page_download_count += 1
-                    processed_image_ids.add(img_id) # Mark as processed only after successful download
-
-                except requests.exceptions.RequestException as e:
-                    self.logger.write(f"Error downloading image ID {img_id} from {img_url}: {str(e)}\n")
-                    # Optionally: remove partially downloaded file if error occurs
-                    if os.path.exists(img_path):
-                        try:
-                            os.remove(img_path)
-                        except OSError as rm_err:
-                            self.logger.write(f"Could not remove partial file {img_path}: {rm_err}\n")
-
-            self.logger.write(f"Downloaded {page_download_count} images from page {params['page']}.\n")
+        # Names already on disk, scanned once instead of stat-ing every image
+        existing = set(os.listdir(model_folder))
+        # Image paths are this prefix plus the file name, so the loop skips os.path.join
+        folder_prefix = os.path.join(model_folder, "")
 
-            # Prepare for the next page
-            metadata = images_data.get('metadata', {})
-            current_page = metadata.get('currentPage', params['page'])
-            # Check if there's a next page hinted by the API, though primary check is empty 'items'
-            next_page_url = metadata.get('nextPage')
-            if not next_page_url:
-                 self.logger.write("API metadata indicates no next page URL.\n")
-                 # break # Removed break here, rely on empty items list as the primary signal
+        downloaded = [] # IDs of saved images, appended by the workers
+        processed_image_ids = set() # Keep track of downloaded image IDs to prevent duplicates across pages
 
-            params['page'] = current_page + 1 # Increment page number for the next request
-            time.sleep(0.5) # Shorter delay between pages, increase if rate limited
+        # Pages are fetched here and their images queued for a pool of workers, so
+        # downloads carry on across page boundaries instead of waiting for each page to finish
+        work = queue.Queue(maxsize=GALLERY_QUEUE_SIZE)
+        with ThreadPoolExecutor(max_workers=IMAGE_WORKERS) as executor:
+            for _ in range(IMAGE_WORKERS):
+                executor.submit(self._download_queued_images, work, downloaded, processed_image_ids)
+            try:
+                while True: # Loop indefinitely until explicitly broken
+                    images_data = self.fetch_gallery_page(params)
+                    # Handle API request failure gracefully
+                    if images_data is None:
+                         self.logger.info(f"Failed to fetch image data for page {params['page']}. Stopping download for this model.")
+                         break
+
+                    images = images_data.get('items', [])
+                    if not images:
+                        # This is the key condition: stop if the API returns an empty list for the current page
+                        self.logger.info("No more images found on this page or subsequent pages.")
+                        break
 
-        self.logger.write(f"Image download process complete for model '{model_name}'. Total images downloaded: {total_downloaded}\n")
+                    page_queued_count = 0
+                    for img in images:
+                        img_id = img.get('id')
+                        img_url = img.get('url')
+
+                        # Skip if no URL or if image ID has already been processed (handles potential API pagination overlap)
+                        if not img_url or not img_id:
+                            self.logger.info(f"Skipping image data with missing URL or ID: {img}")
+                            continue
+
+                        if img_id in processed_image_ids:
+                             self.logger.info(f"Image ID {img_id} already processed, skipping (potential duplicate).")
+                             continue
+
+                        # Determine filename (ensure unique name using image ID)
+                        # Try to get extension from URL, default to jpg
+                        url_parts = img_url.split('.')
+                        img_extension = url_parts[-1].lower() if len(url_parts) > 1 and len(url_parts[-1]) <= 4 else 'jpg'
+                        # Sanitize potentially included parameters in URL extension part
+                        img_extension = _URL_TAIL_RE.sub('', img_extension)
+                        if img_extension not in ['jpg', 'jpeg', 'png', 'webp', 'gif']: # Basic check for valid extensions
+                            self.logger.info(f"Warning: Unusual extension '{img_extension}' for image ID {img_id}. Defaulting to '.jpg'. URL: {img_url}")
+                            img_extension = 'jpg'
+
+                        img_name = f"img_{img_id}.{img_extension}"
+                        # Sanitize the final generated filename
+                        safe_img_name = self.sanitize_filename(img_name)
+                        img_path = folder_prefix + safe_img_name
+
+                        if safe_img_name in existing:
+                            # self.logger.info(f"Image {safe_img_name} already exists, skipping.") # Less verbose logging
+                            processed_image_ids.add(img_id) # Still mark as processed
+                            continue
+
+                        # Queue the image download; marking it now stops a duplicate on a later page from racing it
+                        # self.logger.info(f"Downloading {safe_img_name}...") # Less verbose logging
+                        processed_image_ids.add(img_id)
+                        work.put((img_id, img_url, img_path)) # Blocks while the workers are GALLERY_QUEUE_SIZE items behind
+                        page_queued_count += 1
+
+                    self.logger.info(f"Queued {page_queued_count} images from page {params['page']}.")
+
+                    # Prepare for the next page
+                    metadata = images_data.get('metadata', {})
+                    current_page = metadata.get('currentPage', params['page'])
+                    # Check if there's a next page hinted by the API, though primary check is empty 'items'
+                    next_page_url = metadata.get('nextPage')
+                    if not next_page_url:
+                         self.logger.info("API metadata indicates no next page URL.")
+                         # break # Removed break here, rely on empty items list as the primary signal
+
+                    params['page'] = current_page + 1 # Increment page number for the next request
+                    time.sleep(0.5) # Shorter delay between pages, increase if rate limited
+            finally:
+                # One sentinel per worker; the pool finishes the queued images before the with-block exits
+                for _ in range(IMAGE_WORKERS):
+                    work.put(None)
+
+        total_downloaded = len(downloaded)
+        self.logger.info(f"Image download process complete for model '{model_name}'. Total images downloaded: {total_downloaded}")
 
 
 # Define the missing handler function for Gradio
-# === (Previous code like PrintCapture, CivitaiDownloader class remains the same) ===
+# === (Previous code like the image logger, CivitaiDownloader class remains the same) ===
 
 # Updated handle_image_download function for "All", "SFW Only", "NSFW Only"
-def handle_image_download(api_key, url, nsfw_choice):
-    """Handles the image download request from the Gradio interface."""
-    if not api_key:
-        return "Error: API Key is required."
-    if not url:
-        return "Error: Model Gallery URL is required."
-
-    output_capture.clear()
-    original_stdout = sys.stdout
-    original_stderr = sys.stderr
-    sys.stdout = output_capture # Redirect stdout
-    sys.stderr = output_capture # Redirect stderr
-
+def run_image_download(api_key, url, nsfw_choice, logger):
+    """Run one gallery download, reporting progress through logger."""
     try:
-        downloader = CivitaiDownloader(api_key) # Instantiates the downloader
+        downloader = CivitaiDownloader(api_key, logger) # Instantiates the downloader
 
-        print(f"Parsing URL: {url}") # Use print, it's redirected
+        logger.info(f"Parsing URL: {url}")
         model_id, version_id = downloader.parse_url(url)
-        print(f"Parsed Model ID: {model_id}, Version ID: {version_id if version_id else 'Latest'}")
+        logger.info(f"Parsed Model ID: {model_id}, Version ID: {version_id if version_id else 'Latest'}")
 
-        print("Fetching model information...")
+        logger.info("Fetching model information...")
         model_info = downloader.fetch_model_info(model_id, version_id)
         model_name = model_info['model_name']
-        print(f"Found Model Name: {model_name}")
+        logger.info(f"Found Model Name: {model_name}")
         if version_id and model_info.get('version_name'):
-            print(f"Targeting Version Name: {model_info['version_name']}")
-
-        # --- Corrected NSFW Filter Logic ---
-        nsfw_filter = {} # Start with empty filters
-        print(f"Received NSFW choice from UI: {nsfw_choice}")
-
-        if nsfw_choice == "NSFW Only":
-            # Parameter to request ONLY NSFW images. 'true' is common.
-            nsfw_filter = {'nsfw': 'true'}
-            print("API Filter set to: NSFW Only ({'nsfw': 'true'})")
-            # Note: If 'true' doesn't work, Civitai might use 'Only'. Check API docs if needed.
-        elif nsfw_choice == "SFW Only":
-            # Parameter to request ONLY SFW images (exclude NSFW). 'false' is standard.
-            nsfw_filter = {'nsfw': 'false'}
-            print("API Filter set to: SFW Only ({'nsfw': 'false'})")
-        elif nsfw_choice == "All":
-            # To get ALL images, typically you omit the nsfw parameter entirely.
-            nsfw_filter = {} # Keep the filter dictionary empty
-            print("API Filter set to: All (No 'nsfw' parameter sent)")
-
-        print(f"\nStarting image download for model: {model_name} (ID: {model_id})")
+            logger.info(f"Targeting Version Name: {model_info['version_name']}")
+
+        logger.info(f"Received NSFW choice from UI: {nsfw_choice}")
+        nsfw_filter = _NSFW_FILTERS.get(nsfw_choice, {})
+        logger.info(f"API Filter set to: {nsfw_choice} ({nsfw_filter or 'No nsfw parameter sent'})")
+
+        logger.info(f"\nStarting image download for model: {model_name} (ID: {model_id})")
         downloader.download_gallery(
             model_id=model_id,
             version_id=version_id,
             model_name=model_name,
             filters=nsfw_filter # Pass the determined filter ({} for All)
         )
-        print("\nImage download function finished.")
+        logger.info("\nImage download function finished.")
 
     except ValueError as ve:
-        print(f"Configuration Error: {str(ve)}")
+        logger.info(f"Configuration Error: {str(ve)}")
     except Exception as e:
-        import traceback
-        print("\n--- UNEXPECTED ERROR ---")
-        print(f"An unexpected error occurred: {str(e)}")
-        print("Traceback:")
-        print(traceback.format_exc())
-        print("--- END TRACEBACK ---")
+        logger.info("\n--- UNEXPECTED ERROR ---")
+        logger.info(f"An unexpected error occurred: {str(e)}")
+        # exc_info lets the handler's formatter render the traceback straight into the record
+        logger.info("Traceback:", exc_info=True)
+        logger.info("--- END TRACEBACK ---")
+
+def handle_image_download(api_key, url, nsfw_choice):
+    """Handles the image download request from the Gradio interface, streaming its log as it runs."""
+    if not api_key:
+        yield "Error: API Key is required."
+        return
+    if not url:
+        yield "Error: Model Gallery URL is required."
+        return
+
+    # Capture this request's log lines in a bounded buffer; the filter keeps
+    # lines from other requests running at the same time out of it
+    handler = RingBufferHandler()
+    handler.addFilter(lambda record: getattr(record, "request", None) is handler)
+    image_logger.addHandler(handler)
+    logger = logging.LoggerAdapter(image_logger, {"request": handler})
+
+    # The download runs on its own thread so the log can be yielded to the UI while it works
+    worker = threading.Thread(target=run_image_download, args=(api_key, url, nsfw_choice, logger), daemon=True)
+    worker.start()
+    try:
+        while True:
+            worker.join(STREAM_INTERVAL)
+            yield handler.get_output()
+            if not worker.is_alive():
+                break
     finally:
-        sys.stdout = original_stdout
-        sys.stderr = original_stderr
+        image_logger.removeHandler(handler)
+
+# ===[ Static UI Content ]===
+# Built once at import; the warning is already HTML, so it skips markdown rendering
+WARNING_HTML = '<p style="color:#ff3860; font-weight:bold; background-color:#301b22; padding:10px; border-radius:5px; border:1px solid #ff3860">⚠️ WARNING: To download NSFW content, your CivitAI account settings must have NSFW enabled</p>'
+
+README_MD = """
+# 🚀 CivitAI Fetch
+
+**Developed by Voiid for Personal Use**
+
+## 🔑 API Key Setup
+
+1. Log in to your CivitAI account
+2. Go to https://civitai.com/user/account
+3. Scroll down to "API Keys" section
+4. Generate a new API key
+5. Copy and paste it into the application
+
+## 📦 Model Download Tab
+
+### Single Download Mode:
+- Enter your API key
+- Paste a CivitAI model URL or model ID
+- Select content filter preference (SFW/NSFW)
+- Click "Start Download"
+
+### Bulk Download Mode:
+- Create a text file with one model URL per line
+- Upload the text file
+- Select content filter preference
+- Click "Start Download"
+
+## 🖼️ Image Download Tab
+
+- Enter your API key
+- Paste a CivitAI model gallery URL
+- Select content filter preference (SFW/NSFW)
+- Click "Download Images"
+
+## 📋 Additional Information
+
+- Downloaded models are saved in the **CivitModels** folder
+- Downloaded images are saved in the **CivitImg** folder
+- Reports are generated in the **CivitData** folder
+- Gallery API responses are cached for 24 hours in **CivitData/.httpcache** (set `CIVITFETCH_CACHE_MODE=disabled` to turn this off)
+- The application creates detailed Excel reports with model information
+
+## 🔗 Links
+
+- [GitHub Repository](https://github.com/official-imvoiid)
+- CLI Version also available in the [CivitFetch repository](https://github.com/official-imvoiid/CivitFetch)
+
+## ⚠️ Disclaimer
+
+This tool is for personal use only. The developer is not responsible for any actions taken with this tool or any downloaded content. Users are responsible for complying with CivitAI's terms of service and all applicable laws regarding the use and distribution of AI models and images.
+
+### ⚠️ NSFW Disclaimer
 
-    return output_capture.get_output()
+> **NOTE:** This script **may download NSFW content** if:
+>
+> - Your account or API key **has NSFW enabled**, **AND**
+> - The image/model being downloaded **doesn't include an explicit `NSFW` tag**
+
+Many models/images don’t label NSFW content properly, so there's a **chance of accidental downloads**.
+Building a script that 100% filters NSFW is extremely difficult due to inconsistent tagging.
+🔒 **If you want to avoid all NSFW content**, make sure to **disable NSFW in your account and API key settings**.
+Always **double-check downloaded files** before use.
+
+## 📄 License
+
+For personal use only. Not for commercial use or Redistribution. Project is Under MIT License
+"""
 
 # Main Gradio UI
-with gr.Blocks(theme=hf_theme, title="CivitAI Fetch (Developed By Voiid)") as app:
+with gr.Blocks(theme=hf_theme, title="CivitAI Fetch (Developed By Voiid)", analytics_enabled=False) as app:
     # Title and warning section
     gr.Markdown("# 🚀 CivitAI Fetch")
-    gr.Markdown('<p style="color:#ff3860; font-weight:bold; background-color:#301b22; padding:10px; border-radius:5px; border:1px solid #ff3860">⚠️ WARNING: To download NSFW content, your CivitAI account settings must have NSFW enabled</p>', elem_id="warning")
+    gr.HTML(WARNING_HTML, elem_id="warning")
     gr.Markdown("Developed by Voiid for Personal Use")
     
     with gr.Tabs():
@@ -833,72 +1210,14 @@ with gr.Blocks(theme=hf_theme, title="CivitAI Fetch (Developed By Voiid)") as ap
             )
 
         with gr.Tab("📚 README"):
-            gr.Markdown("""
-            # 🚀 CivitAI Fetch
-            
-            **Developed by Voiid for Personal Use**
-            
-            ## 🔑 API Key Setup
-            
-            1. Log in to your CivitAI account
-            2. Go to https://civitai.com/user/account
-            3. Scroll down to "API Keys" section
-            4. Generate a new API key
-            5. Copy and paste it into the application
-            
-            ## 📦 Model Download Tab
-            
-            ### Single Download Mode:
-            - Enter your API key
-            - Paste a CivitAI model URL or model ID
-            - Select content filter preference (SFW/NSFW)
-            - Click "Start Download"
-            
-            ### Bulk Download Mode:
-            - Create a text file with one model URL per line
-            - Upload the text file
-            - Select content filter preference
-            - Click "Start Download"
-            
-            ## 🖼️ Image Download Tab
-            
-            - Enter your API key
-            - Paste a CivitAI model gallery URL
-            - Select content filter preference (SFW/NSFW)
-            - Click "Download Images"
-            
-            ## 📋 Additional Information
-            
-            - Downloaded models are saved in the **CivitModels** folder
-            - Downloaded images are saved in the **CivitImg** folder
-            - Reports are generated in the **CivitData** folder
-            - The application creates detailed Excel reports with model information
-            
-            ## 🔗 Links
-            
-            - [GitHub Repository](https://github.com/official-imvoiid)
-            - CLI Version also available in the [CivitFetch repository](https://github.com/official-imvoiid/CivitFetch)
-            
-            ## ⚠️ Disclaimer
-            
-            This tool is for personal use only. The developer is not responsible for any actions taken with this tool or any downloaded content. Users are responsible for complying with CivitAI's terms of service and all applicable laws regarding the use and distribution of AI models and images.
-
-            ### ⚠️ NSFW Disclaimer
-
-            > **NOTE:** This script **may download NSFW content** if:
-            >
-            > - Your account or API key **has NSFW enabled**, **AND**
-            > - The image/model being downloaded **doesn't include an explicit `NSFW` tag**
-            
-            Many models/images don’t label NSFW content properly, so there's a **chance of accidental downloads**.
-            Building a script that 100% filters NSFW is extremely difficult due to inconsistent tagging.
-            🔒 **If you want to avoid all NSFW content**, make sure to **disable NSFW in your account and API key settings**.
-            Always **double-check downloaded files** before use.
-                        
-            ## 📄 License
-            
-            For personal use only. Not for commercial use or Redistribution. Project is Under MIT License
-            """)
+            gr.Markdown(README_MD)
 
 if __name__ == "__main__":
-    app.launch()
\ No newline at end of file
+    # The queue is what lets Gradio stream the handlers' generator output; it
+    # runs up to QUEUE_CONCURRENCY downloads side by side instead of one at a time
+    try:
+        app.queue(default_concurrency_limit=QUEUE_CONCURRENCY, max_size=QUEUE_MAX_SIZE) # Gradio 4+
+    except TypeError:
+        app.queue(concurrency_count=QUEUE_CONCURRENCY, max_size=QUEUE_MAX_SIZE) # Gradio 3.x
+    # Bound to localhost, the address webui.bat waits on and opens
+    app.launch(server_name="127.0.0.1", max_threads=SERVER_THREADS)
\ No newline at end of file